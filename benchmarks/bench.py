@@ -0,0 +1,446 @@
+"""Benchmarks of the MCP Jupyter server tools.
+
+Generates synthetic notebooks, calls the tools directly through
+handle_call_tool and through the stdio and SSE transports, and writes the
+latency percentiles, throughput, import and kernel startup time and peak RSS
+to a JSON file. Runs offline against the local ipykernel.
+
+Usage:
+    python benchmarks/bench.py [--quick] [--output results.json]
+        [--compare baseline.json] [--transports direct,stdio,sse]
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import json
+import os
+import platform
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+import nbformat
+from import_time import measure_import
+from mcp import ClientSession
+from mcp.client.sse import sse_client
+from mcp.client.stdio import StdioServerParameters, stdio_client
+from PIL import Image
+
+# Synthetic notebooks: number of code cells, bytes of text output per cell,
+# number of image outputs per cell and number of text outputs it is split in
+NOTEBOOK_SHAPES = {
+    "small": {"cells": 20, "output_bytes": 200, "images": 0},
+    "text_heavy": {"cells": 200, "output_bytes": 50_000, "images": 0},
+    "image_heavy": {"cells": 40, "output_bytes": 200, "images": 2},
+    "many_outputs": {"cells": 2000, "output_bytes": 800, "images": 0, "outputs": 10},
+}
+
+READ_TOOLS = (
+    "read_notebook_with_outputs",
+    "read_notebook_source_only",
+    "read_output_of_cell",
+)
+
+SERVER_COMMAND = [sys.executable, "-c", "from mcp_server_jupyter import main; main()"]
+
+
+def make_notebook(
+    path: str, cells: int, output_bytes: int, images: int, outputs: int = 1
+) -> list[str]:
+    """Write a synthetic notebook
+
+    Returns:
+        The IDs of its cells
+    """
+    # Noise compresses about as badly as a dense plot does
+    buffer = io.BytesIO()
+    Image.effect_noise((800, 600), 64).convert("RGB").save(buffer, format="PNG")
+    png = base64.b64encode(buffer.getvalue()).decode()
+
+    nb = nbformat.v4.new_notebook()
+    line = "x" * 79 + "\n"
+    for i in range(cells):
+        cell = nbformat.v4.new_code_cell(f"# cell {i}\nvalue = {i}\nprint(value)")
+        cell.outputs = [
+            nbformat.v4.new_output(
+                "stream",
+                name="stdout",
+                text=line * (output_bytes // outputs // len(line) + 1),
+            )
+            for _ in range(outputs)
+        ]
+        for _ in range(images):
+            cell.outputs.append(
+                nbformat.v4.new_output(
+                    "display_data",
+                    data={"image/png": png, "text/plain": "<Figure>"},
+                )
+            )
+        nb.cells.append(cell)
+        nb.cells.append(nbformat.v4.new_markdown_cell(f"## Section {i}"))
+    nbformat.write(nb, path)
+    return [cell.id for cell in nb.cells]
+
+
+def summarize(samples: list[float]) -> dict[str, Any]:
+    """Latency percentiles of samples given in seconds"""
+    ordered = sorted(samples)
+    p95_index = min(len(ordered) - 1, round(0.95 * (len(ordered) - 1)))
+    return {
+        "n": len(ordered),
+        "p50_ms": round(statistics.median(ordered) * 1000, 3),
+        "p95_ms": round(ordered[p95_index] * 1000, 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+    }
+
+
+async def time_calls(
+    call: Callable[[], Awaitable[Any]],
+    repeat: int,
+    before: Callable[[], None] | None = None,
+) -> dict[str, Any]:
+    """Time repeated awaits of call, after one untimed warm-up call"""
+    await call()
+    samples = []
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        await call()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def tool_arguments(
+    tool: str, notebook_path: str, cell_ids: list[str]
+) -> dict[str, Any]:
+    arguments: dict[str, Any] = {"notebook_path": notebook_path}
+    if tool == "read_output_of_cell":
+        # A code cell in the middle, code and markdown cells alternate
+        arguments["cell_id"] = cell_ids[len(cell_ids) // 4 * 2]
+    return arguments
+
+
+async def bench_direct(
+    notebooks: dict[str, tuple[str, list[str]]], repeat: int, concurrency: int
+) -> dict[str, Any]:
+    """Tool calls through handle_call_tool, without a transport"""
+    from mcp_server_jupyter import server
+    from mcp_server_jupyter.notebook_cache import notebook_cache
+
+    results: dict[str, Any] = {}
+    for shape, (path, cell_ids) in notebooks.items():
+        for tool in READ_TOOLS:
+            arguments = tool_arguments(tool, path, cell_ids)
+
+            async def call(tool: str = tool, arguments: dict = arguments) -> Any:
+                return await server.handle_call_tool(tool, arguments)
+
+            results[f"direct/{shape}/{tool}/warm"] = await time_calls(call, repeat)
+            results[f"direct/{shape}/{tool}/cold"] = await time_calls(
+                call, repeat, before=notebook_cache.clear
+            )
+
+        edit = {"notebook_path": path, "cell_id": cell_ids[-1], "source": "## Edited"}
+        results[f"direct/{shape}/edit_cell"] = await time_calls(
+            lambda edit=edit: server.handle_call_tool("edit_cell", edit), repeat
+        )
+
+        arguments = {"notebook_path": path}
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(
+                server.handle_call_tool("read_notebook_source_only", arguments)
+                for _ in range(concurrency * repeat)
+            )
+        )
+        elapsed = time.perf_counter() - start
+        results[f"direct/{shape}/concurrent_reads"] = {
+            "calls": concurrency * repeat,
+            "calls_per_s": round(concurrency * repeat / elapsed, 2),
+        }
+
+    return results
+
+
+async def bench_execution(directory: str, repeat: int) -> dict[str, Any]:
+    """Kernel startup and cell execution on a local ipykernel"""
+    from mcp_server_jupyter import server
+    from mcp_server_jupyter.kernel_session import KernelSession, kernel_sessions
+
+    path = os.path.join(directory, "execute.ipynb")
+    nb = nbformat.v4.new_notebook()
+    nb.cells = [nbformat.v4.new_code_cell("total = sum(range(1000))\ntotal")]
+    nbformat.write(nb, path)
+
+    startups = []
+    for _ in range(max(2, repeat // 5)):
+        session = KernelSession(path)
+        start = time.perf_counter()
+        session.start(nb)
+        startups.append(time.perf_counter() - start)
+        session.shutdown()
+
+    arguments = {"notebook_path": path, "cell_id": nb.cells[0].id}
+    start = time.perf_counter()
+    await server.handle_call_tool("execute_cell", arguments)
+    first_call = time.perf_counter() - start
+
+    results = {
+        "execution/kernel_startup": summarize(startups),
+        "execution/execute_cell/first_call_ms": round(first_call * 1000, 3),
+        "execution/execute_cell/warm": await time_calls(
+            lambda: server.handle_call_tool("execute_cell", arguments), repeat
+        ),
+    }
+    kernel_sessions.shutdown_all()
+    return results
+
+
+@asynccontextmanager
+async def stdio_session() -> AsyncIterator[ClientSession]:
+    params = StdioServerParameters(
+        command=SERVER_COMMAND[0],
+        args=[*SERVER_COMMAND[1:], "stdio"],
+        env=dict(os.environ),
+    )
+    async with stdio_client(params) as (read_stream, write_stream):
+        async with ClientSession(read_stream, write_stream) as session:
+            await session.initialize()
+            yield session
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@asynccontextmanager
+async def sse_server() -> AsyncIterator[tuple[str, subprocess.Popen]]:
+    """Run the server with the SSE transport in a subprocess
+
+    Yields:
+        The URL of its SSE endpoint and the server process
+    """
+    port = _free_port()
+    process = subprocess.Popen(
+        [*SERVER_COMMAND, "sse", "--port", str(port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline or process.poll() is not None:
+                    raise RuntimeError("SSE server did not start")
+                await asyncio.sleep(0.05)
+        yield f"http://127.0.0.1:{port}/sse", process
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            # Uvicorn waits for SSE streams that outlive their clients
+            process.kill()
+            process.wait()
+
+
+@asynccontextmanager
+async def sse_session(url: str) -> AsyncIterator[ClientSession]:
+    async with sse_client(url) as (read_stream, write_stream):
+        async with ClientSession(read_stream, write_stream) as session:
+            await session.initialize()
+            yield session
+
+
+async def bench_session(
+    transport: str,
+    session: ClientSession,
+    notebooks: dict[str, tuple[str, list[str]]],
+    repeat: int,
+) -> dict[str, Any]:
+    results = {}
+    for shape, (path, cell_ids) in notebooks.items():
+        for tool in READ_TOOLS:
+            arguments = tool_arguments(tool, path, cell_ids)
+            results[f"{transport}/{shape}/{tool}"] = await time_calls(
+                lambda tool=tool, arguments=arguments: session.call_tool(
+                    tool, arguments
+                ),
+                repeat,
+            )
+    return results
+
+
+async def bench_stdio(
+    notebooks: dict[str, tuple[str, list[str]]], repeat: int
+) -> dict[str, Any]:
+    """Tool calls through a stdio server subprocess"""
+    startups = []
+    for _ in range(max(2, repeat // 5)):
+        start = time.perf_counter()
+        async with stdio_session():
+            startups.append(time.perf_counter() - start)
+
+    async with stdio_session() as session:
+        results = await bench_session("stdio", session, notebooks, repeat)
+    results["stdio/server_startup"] = summarize(startups)
+    return results
+
+
+async def bench_sse(
+    notebooks: dict[str, tuple[str, list[str]]], repeat: int, concurrency: int
+) -> dict[str, Any]:
+    """Tool calls through an SSE server subprocess, from one and many clients"""
+    async with sse_server() as (url, process):
+        async with sse_session(url) as session:
+            results = await bench_session("sse", session, notebooks, repeat)
+
+        for shape, (path, _) in notebooks.items():
+
+            async def client(path: str = path) -> None:
+                async with sse_session(url) as session:
+                    for _ in range(repeat):
+                        await session.call_tool(
+                            "read_notebook_source_only", {"notebook_path": path}
+                        )
+
+            start = time.perf_counter()
+            await asyncio.gather(*(client() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - start
+            results[f"sse/{shape}/concurrent_clients"] = {
+                "clients": concurrency,
+                "calls": concurrency * repeat,
+                "calls_per_s": round(concurrency * repeat / elapsed, 2),
+            }
+        results["sse/peak_rss_mb"] = peak_rss(process.pid)
+    return results
+
+
+def peak_rss(pid: int | None = None) -> float | None:
+    """Peak resident set size in MB of this process, or of another one
+
+    Other processes are read from /proc, as the ru_maxrss of children
+    includes the memory they shared with this process when forked.
+    """
+    if pid is None:
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        scale = 1 if sys.platform == "darwin" else 1024
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(maxrss * scale / 2**20, 1)
+
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict[str, Any], baseline: dict[str, Any]) -> None:
+    """Print the change of every p50 latency against a baseline run"""
+    for name, value in results.items():
+        previous = baseline.get(name)
+        if not isinstance(value, dict) or not isinstance(previous, dict):
+            continue
+        if "p50_ms" in value and "p50_ms" in previous and previous["p50_ms"]:
+            ratio = value["p50_ms"] / previous["p50_ms"]
+            print(
+                f"{name}: {previous['p50_ms']:.2f} -> {value['p50_ms']:.2f} ms "
+                f"p50 ({ratio:.2f}x)"
+            )
+        elif "calls_per_s" in value and "calls_per_s" in previous:
+            print(
+                f"{name}: {previous['calls_per_s']} -> {value['calls_per_s']} calls/s"
+            )
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    transports = set(args.transports.split(","))
+    with tempfile.TemporaryDirectory() as directory:
+        notebooks = {}
+        shapes = {"small": NOTEBOOK_SHAPES["small"]} if args.quick else NOTEBOOK_SHAPES
+        for shape, params in shapes.items():
+            path = os.path.join(directory, f"{shape}.ipynb")
+            notebooks[shape] = (path, make_notebook(path, **params))
+
+        results: dict[str, Any] = {
+            "import/server": measure_import(max(3, args.repeat // 4))
+        }
+        if "direct" in transports:
+            results.update(await bench_direct(notebooks, args.repeat, args.concurrency))
+            results.update(await bench_execution(directory, args.repeat))
+        if "stdio" in transports:
+            results.update(await bench_stdio(notebooks, args.repeat))
+        if "sse" in transports:
+            results.update(await bench_sse(notebooks, args.repeat, args.concurrency))
+        results["peak_rss_mb"] = peak_rss()
+        return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="Small notebook only")
+    parser.add_argument("--repeat", type=int, default=20, help="Calls per benchmark")
+    parser.add_argument(
+        "--concurrency", type=int, default=8, help="Concurrent clients or calls"
+    )
+    parser.add_argument(
+        "--transports",
+        default="direct,stdio,sse",
+        help="Comma separated transports to benchmark (default: direct,stdio,sse)",
+    )
+    parser.add_argument(
+        "--output", default="benchmark-results.json", help="File to write results to"
+    )
+    parser.add_argument("--compare", help="Results of a previous run to compare with")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "arguments": vars(args),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f)["results"])
+
+
+if __name__ == "__main__":
+    main()
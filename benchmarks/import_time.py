@@ -0,0 +1,113 @@
+"""Import time regression check of the MCP Jupyter server.
+
+Imports mcp_server_jupyter.server in fresh interpreters, as an MCP client
+spawning a stdio server does, and fails if a module that only execution or the
+SSE transport need was imported along the way. That check does not depend on
+the speed of the machine, so it is what catches imports made eager again.
+
+The median time the server's own modules take to import is also checked
+against a budget, loose enough for slow CI runners, which catches only gross
+regressions such as a heavy new dependency. The MCP SDK and nbformat, which
+the server always needs, are imported first and timed apart: they take most of
+the time and vary the most between machines, while nothing the server does
+changes them.
+
+Run by CI. Usage:
+    python benchmarks/import_time.py [--repeat 7] [--budget-ms 400]
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from typing import Any
+
+# Modules that must only be imported once a tool or transport needs them.
+# Starlette and uvicorn are missing as the mcp package itself imports them.
+DEFERRED_MODULES = (
+    "mcp_server_jupyter.sse_app",
+    "mcp_server_jupyter.streaming_client",
+    "nbclient",
+    "jupyter_client",
+    "PIL",
+)
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import mcp.server.stdio, mcp.types, nbformat
+dependencies = time.perf_counter()
+import mcp_server_jupyter.server
+end = time.perf_counter()
+print(json.dumps({
+    "seconds": end - start,
+    "own_seconds": end - dependencies,
+    "modules": sorted(sys.modules),
+}))
+"""
+
+
+def measure_import(repeat: int) -> dict[str, Any]:
+    """Time the import of the server module in repeat fresh interpreters
+
+    Returns:
+        The median and slowest import times, the median time of the server's
+        own modules, and the deferred modules that were imported anyway
+    """
+    samples = []
+    own_samples = []
+    eager: set[str] = set()
+    for _ in range(repeat):
+        probe = subprocess.run(
+            [sys.executable, "-c", _PROBE], capture_output=True, text=True, check=True
+        )
+        result = json.loads(probe.stdout)
+        samples.append(result["seconds"])
+        own_samples.append(result["own_seconds"])
+        eager.update(
+            deferred
+            for deferred in DEFERRED_MODULES
+            for module in result["modules"]
+            if module == deferred or module.startswith(deferred + ".")
+        )
+    return {
+        "n": repeat,
+        "p50_ms": round(statistics.median(samples) * 1000, 3),
+        "max_ms": round(max(samples) * 1000, 3),
+        "own_p50_ms": round(statistics.median(own_samples) * 1000, 3),
+        "eager_modules": sorted(eager),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=7, help="Fresh imports to time")
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=400,
+        help="Maximum median import time of the server's own modules, past the "
+        "MCP SDK and nbformat, in milliseconds (default: 400)",
+    )
+    args = parser.parse_args()
+
+    result = measure_import(args.repeat)
+    print(
+        f"import mcp_server_jupyter.server: {result['p50_ms']:.1f} ms p50, "
+        f"{result['max_ms']:.1f} ms max over {result['n']} runs, "
+        f"{result['own_p50_ms']:.1f} ms p50 past the MCP SDK and nbformat"
+    )
+
+    failures = []
+    if result["eager_modules"]:
+        failures.append(f"imported eagerly: {', '.join(result['eager_modules'])}")
+    if result["own_p50_ms"] > args.budget_ms:
+        failures.append(f"median exceeds the budget of {args.budget_ms:.0f} ms")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
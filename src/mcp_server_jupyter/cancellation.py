@@ -0,0 +1,174 @@
+import contextvars
+import logging
+import math
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Callable, Iterator, Optional
+
+import anyio
+import anyio.to_thread
+import mcp.types as types
+from anyio.streams.memory import MemoryObjectReceiveStream, MemoryObjectSendStream
+
+logger = logging.getLogger(__name__)
+
+CANCELLED_NOTIFICATION = "notifications/cancelled"
+
+# Cancellations of requests that have not started yet kept per connection
+MAX_EARLY_CANCELLATIONS = 256
+
+
+class Cancellation:
+    """Cancellation state of a tool call.
+
+    Handlers register what to do if the client cancels the call, like
+    interrupting the kernel running it, for as long as that applies.
+    """
+
+    def __init__(self) -> None:
+        self.cancelled: bool = False
+        self._callbacks: list[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def cancel(self) -> None:
+        """Mark the call cancelled and run its callbacks"""
+        # Callbacks run under the lock, so none runs once it is removed
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            for callback in self._callbacks:
+                try:
+                    callback()
+                except Exception:
+                    logger.exception("Cancellation callback failed")
+
+    def add_callback(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            self._callbacks.append(callback)
+
+    def remove_callback(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            self._callbacks.remove(callback)
+
+    @contextmanager
+    def on_cancel(self, callback: Callable[[], None]) -> Iterator[None]:
+        """Run callback if the call is cancelled while in the block"""
+        self.add_callback(callback)
+        try:
+            yield
+        finally:
+            self.remove_callback(callback)
+
+
+class ConnectionCalls:
+    """Cancellation states of the tool calls of one client connection, by
+    request ID"""
+
+    def __init__(self) -> None:
+        self._calls: dict[types.RequestId, Cancellation] = {}
+        # Requests cancelled before they started, as requests of a connection
+        # are handled one at a time
+        self._early: OrderedDict[types.RequestId, Cancellation] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, request_id: types.RequestId) -> Cancellation:
+        with self._lock:
+            cancellation = self._early.pop(request_id, None) or Cancellation()
+            self._calls[request_id] = cancellation
+            return cancellation
+
+    def finish(self, request_id: types.RequestId) -> None:
+        with self._lock:
+            self._calls.pop(request_id, None)
+
+    def cancel(self, request_id: types.RequestId) -> None:
+        with self._lock:
+            cancellation = self._calls.get(request_id)
+            if cancellation is None:
+                cancellation = self._early.setdefault(request_id, Cancellation())
+                while len(self._early) > MAX_EARLY_CANCELLATIONS:
+                    self._early.popitem(last=False)
+        cancellation.cancel()
+
+
+_connection_calls: contextvars.ContextVar[Optional[ConnectionCalls]] = (
+    contextvars.ContextVar("connection_calls", default=None)
+)
+# The cancellation of the tool call whose handler is running, propagated to
+# dispatcher threads
+_current: contextvars.ContextVar[Optional[Cancellation]] = contextvars.ContextVar(
+    "current_cancellation", default=None
+)
+
+
+def current_cancellation() -> Cancellation:
+    """Cancellation of the current tool call, one never cancelled outside of a
+    cancellable request"""
+    return _current.get() or Cancellation()
+
+
+@contextmanager
+def tracking_call(request_id: Optional[types.RequestId]) -> Iterator[Cancellation]:
+    """Make the current tool call cancellable by the client, by request ID"""
+    calls = _connection_calls.get()
+    if calls is None or request_id is None:
+        yield current_cancellation()
+        return
+
+    cancellation = calls.start(request_id)
+    token = _current.set(cancellation)
+    try:
+        yield cancellation
+    finally:
+        _current.reset(token)
+        calls.finish(request_id)
+
+
+@asynccontextmanager
+async def cancellable_requests(
+    read_stream: MemoryObjectReceiveStream[types.JSONRPCMessage | Exception],
+) -> AsyncIterator[MemoryObjectReceiveStream[types.JSONRPCMessage | Exception]]:
+    """Take the cancellation notifications out of the messages of a client
+    connection, cancelling the tool calls they name
+
+    Messages are read ahead of the server, which handles the requests of a
+    connection one at a time, so a cancellation reaches a running call.
+
+    Yields:
+        The other messages, to pass on to the server
+    """
+    calls = ConnectionCalls()
+    token = _connection_calls.set(calls)
+    send_stream, receive_stream = anyio.create_memory_object_stream[
+        types.JSONRPCMessage | Exception
+    ](math.inf)
+    try:
+        async with anyio.create_task_group() as task_group:
+            task_group.start_soon(_forward, read_stream, send_stream, calls)
+            async with receive_stream:
+                yield receive_stream
+            task_group.cancel_scope.cancel()
+    finally:
+        _connection_calls.reset(token)
+
+
+async def _forward(
+    read_stream: MemoryObjectReceiveStream[types.JSONRPCMessage | Exception],
+    send_stream: MemoryObjectSendStream[types.JSONRPCMessage | Exception],
+    calls: ConnectionCalls,
+) -> None:
+    async with send_stream:
+        async for message in read_stream:
+            if (
+                not isinstance(message, Exception)
+                and isinstance(message.root, types.JSONRPCNotification)
+                and message.root.method == CANCELLED_NOTIFICATION
+            ):
+                request_id = (message.root.params or {}).get("requestId")
+                if request_id is not None:
+                    # Interrupting a kernel blocks, keep it off the event loop
+                    await anyio.to_thread.run_sync(calls.cancel, request_id)
+                continue
+            await send_stream.send(message)
@@ -0,0 +1,116 @@
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from mcp_server_jupyter.kernel_session import KernelSession
+
+T = TypeVar("T")
+
+
+def _in_context(func: Callable[..., T], *args: Any) -> Callable[[], T]:
+    """Bind func to its arguments and to the current context, so it sees the
+    context variables of the tool call when run on another thread"""
+    context = contextvars.copy_context()
+    return lambda: context.run(func, *args)
+
+
+class ToolDispatcher:
+    """Runs blocking tool handlers off the event loop.
+
+    Notebook reads and writes run on a shared pool of I/O threads, while cell
+    executions run on the thread of the notebook's kernel session, with a cap
+    on how many executions may be in flight at once. Whole-notebook jobs run
+    on their own pool.
+    """
+
+    def __init__(
+        self,
+        io_workers: int = 8,
+        max_executions: int = 4,
+        max_notebook_jobs: int = os.cpu_count() or 1,
+    ) -> None:
+        self.io_workers: int = io_workers
+        self.max_executions: int = max_executions
+        self.max_notebook_jobs: int = max_notebook_jobs
+        self._io_executor: Optional[ThreadPoolExecutor] = None
+        self._job_executor: Optional[ThreadPoolExecutor] = None
+        self._execution_slots: Optional[asyncio.Semaphore] = None
+
+    def configure(
+        self,
+        io_workers: int,
+        max_executions: int,
+        max_notebook_jobs: Optional[int] = None,
+    ) -> None:
+        """Set the concurrency limits, before any tool has been dispatched
+
+        Args:
+            io_workers: Number of threads serving notebook reads and writes
+            max_executions: Maximum number of cells executing at the same time
+            max_notebook_jobs: Maximum number of whole notebooks executing at the
+                 same time, each on its own kernel
+        """
+        max_notebook_jobs = max_notebook_jobs or self.max_notebook_jobs
+        if io_workers < 1 or max_executions < 1 or max_notebook_jobs < 1:
+            raise ValueError("Concurrency limits must be at least 1")
+
+        self.shutdown()
+        self.io_workers = io_workers
+        self.max_executions = max_executions
+        self.max_notebook_jobs = max_notebook_jobs
+
+    async def run_io(self, func: Callable[..., T], *args: Any) -> T:
+        """Run a notebook I/O handler on the I/O thread pool"""
+        if self._io_executor is None:
+            self._io_executor = ThreadPoolExecutor(
+                max_workers=self.io_workers, thread_name_prefix="notebook-io"
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._io_executor, _in_context(func, *args))
+
+    async def run_execution(
+        self, session: KernelSession, func: Callable[..., T], *args: Any
+    ) -> T:
+        """Run an execution handler on the thread of a kernel session"""
+        if self._execution_slots is None:
+            self._execution_slots = asyncio.Semaphore(self.max_executions)
+        async with self._execution_slots:
+            # Submitted through the session, so it counts as busy meanwhile
+            return await asyncio.wrap_future(session.submit(_in_context(func, *args)))
+
+    async def run_notebook_jobs(
+        self, func: Callable[..., T], jobs: list[tuple[Any, ...]]
+    ) -> list[T]:
+        """Run a notebook job handler once per job, in parallel
+
+        Each job runs on a thread of the notebook job pool and starts its own
+        kernel, so the kernels spread over the available cores.
+
+        Returns:
+            The result of each job, in order
+        """
+        if self._job_executor is None:
+            self._job_executor = ThreadPoolExecutor(
+                max_workers=self.max_notebook_jobs, thread_name_prefix="notebook-job"
+            )
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(
+            *(
+                loop.run_in_executor(self._job_executor, _in_context(func, *job))
+                for job in jobs
+            )
+        )
+
+    def shutdown(self) -> None:
+        """Release the I/O and notebook job threads"""
+        for executor in (self._io_executor, self._job_executor):
+            if executor is not None:
+                executor.shutdown(wait=False)
+        self._io_executor = None
+        self._job_executor = None
+        self._execution_slots = None
+
+
+dispatcher = ToolDispatcher()
@@ -0,0 +1,106 @@
+import copy
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from nbformat import NotebookNode
+
+from mcp_server_jupyter.metrics import execution_cache_lookups
+
+# Cells tagged with this are always executed, never served from the cache
+NO_CACHE_TAG = "no-cache"
+
+
+@dataclass
+class CachedExecution:
+    outputs: list[NotebookNode]
+    execution_count: Optional[int]
+    stored_at: float
+    nbytes: int
+
+
+def execution_key(kernel_name: str, source: str, kernel_state: str) -> str:
+    """Key of an execution of source on a kernel whose state is kernel_state"""
+    return hashlib.sha256(
+        f"{kernel_name}\0{kernel_state}\0{source}".encode()
+    ).hexdigest()
+
+
+class ExecutionCache:
+    """Outputs of previous cell executions, keyed by execution_key.
+
+    Entries expire after ttl seconds and the least recently used ones are
+    evicted once the outputs exceed max_bytes. A max_bytes of 0 disables it.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl: float = 3600) -> None:
+        self.max_bytes: int = max_bytes
+        self.ttl: float = ttl
+        self._entries: OrderedDict[str, CachedExecution] = OrderedDict()
+        self._total_bytes: int = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, key: str) -> Optional[CachedExecution]:
+        """Get a copy of the cached outputs of an execution, if still fresh"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                execution_cache_lookups.inc("miss")
+                return None
+
+            if time.monotonic() - entry.stored_at > self.ttl:
+                self._remove(key)
+                execution_cache_lookups.inc("expired")
+                return None
+
+            execution_cache_lookups.inc("hit")
+            self._entries.move_to_end(key)
+            return CachedExecution(
+                outputs=copy.deepcopy(entry.outputs),
+                execution_count=entry.execution_count,
+                stored_at=entry.stored_at,
+                nbytes=entry.nbytes,
+            )
+
+    def put(self, key: str, outputs: list[NotebookNode], execution_count: Any) -> None:
+        """Record the outputs of an execution"""
+        if not self.enabled:
+            return
+
+        nbytes = len(json.dumps(outputs))
+        entry = CachedExecution(
+            outputs=copy.deepcopy(outputs),
+            execution_count=execution_count,
+            stored_at=time.monotonic(),
+            nbytes=nbytes,
+        )
+        with self._lock:
+            self._remove(key)
+            if nbytes > self.max_bytes:
+                return
+
+            self._entries[key] = entry
+            self._total_bytes += nbytes
+            while self._total_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry.nbytes
+
+
+execution_cache = ExecutionCache()
@@ -0,0 +1,134 @@
+import base64
+import binascii
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# Formats a reduced image may be re-encoded to, with their MIME types
+IMAGE_FORMATS = {
+    "png": "image/png",
+    "webp": "image/webp",
+    "jpeg": "image/jpeg",
+}
+
+# Lossy encoder qualities tried in turn until an image fits max_bytes
+QUALITY_STEPS = (85, 70, 50, 35)
+
+
+class ImageReducer:
+    """Downscales and re-encodes image outputs so they fit a size budget.
+
+    Reduced images are cached by a hash of the original payload, so repeated
+    reads of the same output do not re-encode it.
+    """
+
+    def __init__(
+        self,
+        max_dimension: int = 1024,
+        max_bytes: int = 256 * 1024,
+        image_format: str = "webp",
+        cache_size: int = 256,
+    ) -> None:
+        self.max_dimension: int = max_dimension
+        self.max_bytes: int = max_bytes
+        self.image_format: str = image_format
+        self.cache_size: int = cache_size
+        self._cache: OrderedDict[tuple, tuple[str, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def reduce(self, data: str, mime_type: str) -> tuple[str, str]:
+        """Reduce a base64 encoded image
+
+        Args:
+            data: Base64 encoded image
+            mime_type: MIME type of the image
+
+        Returns:
+            The base64 encoded reduced image and its MIME type, or the original
+            image if it already fits or cannot be reduced
+        """
+        if self.max_dimension <= 0 and self.max_bytes <= 0:
+            return data, mime_type
+
+        key = (
+            hashlib.sha256(data.encode()).digest(),
+            mime_type,
+            self.max_dimension,
+            self.max_bytes,
+            self.image_format,
+        )
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        result = self._reduce(data, mime_type)
+
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def _reduce(self, data: str, mime_type: str) -> tuple[str, str]:
+        # Imported on first use, most sessions never reduce an image
+        from PIL import Image
+
+        try:
+            raw = base64.b64decode(data)
+            image = Image.open(io.BytesIO(raw))
+            image.load()
+        except (binascii.Error, OSError, ValueError):
+            return data, mime_type
+
+        too_large = 0 < self.max_dimension < max(image.size)
+        if not too_large and (self.max_bytes <= 0 or len(raw) <= self.max_bytes):
+            return data, mime_type
+
+        if too_large:
+            image.thumbnail((self.max_dimension, self.max_dimension))
+
+        encoded = self._encode(image)
+        # Keep shrinking until the image fits, but never below a legible size
+        while 0 < self.max_bytes < len(encoded) and min(image.size) > 64:
+            image = image.resize(
+                (int(image.width * 0.75), int(image.height * 0.75)),
+                Image.Resampling.LANCZOS,
+            )
+            encoded = self._encode(image)
+
+        if not too_large and len(encoded) >= len(raw):
+            return data, mime_type
+        return base64.b64encode(encoded).decode(), IMAGE_FORMATS[self.image_format]
+
+    def _encode(self, image: "Image.Image") -> bytes:
+        from PIL import Image
+
+        if self.image_format == "png":
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG", optimize=True)
+            return buffer.getvalue()
+
+        if self.image_format == "jpeg" and image.mode not in ("RGB", "L"):
+            # JPEG has no alpha channel, flatten onto white like most viewers do
+            background = Image.new("RGB", image.size, "white")
+            rgba = image.convert("RGBA")
+            background.paste(rgba, mask=rgba.getchannel("A"))
+            image = background
+
+        encoded = b""
+        for quality in QUALITY_STEPS:
+            buffer = io.BytesIO()
+            image.save(buffer, format=self.image_format.upper(), quality=quality)
+            encoded = buffer.getvalue()
+            if self.max_bytes <= 0 or len(encoded) <= self.max_bytes:
+                break
+        return encoded
+
+
+image_reducer = ImageReducer()
@@ -0,0 +1,742 @@
+import hashlib
+import math
+import numbers
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Optional, TypeVar, cast
+
+import nbformat
+from nbformat import NotebookNode
+
+from mcp_server_jupyter.cancellation import current_cancellation
+from mcp_server_jupyter.metrics import (
+    cell_execution_seconds,
+    kernel_startup_seconds,
+    kernel_stops,
+    metrics,
+)
+
+if TYPE_CHECKING:
+    from jupyter_client.asynchronous.client import AsyncKernelClient
+    from jupyter_client.manager import KernelManager
+
+    from mcp_server_jupyter.streaming_client import StreamingNotebookClient
+
+T = TypeVar("T")
+
+# Seconds a cell may run when neither the cell nor the tool call sets a limit
+DEFAULT_CELL_TIMEOUT = 600
+
+# Cell metadata field with the seconds the cell may run, overriding the default
+TIMEOUT_METADATA_KEY = "timeout"
+
+# Name of the error nbclient reports for a cell interrupted after its timeout
+TIMEOUT_ERROR_NAME = "CellTimeoutError"
+
+# Seconds an expression evaluated outside of any cell may take
+EVALUATE_TIMEOUT = 30
+
+
+class ExecutionInterrupted(Exception):
+    """A cell was interrupted as it ran out of time or its tool call was
+    cancelled. The cell holds the outputs it produced until then, and is None
+    if it never started."""
+
+    def __init__(self, message: str, cell: Optional[NotebookNode] = None) -> None:
+        super().__init__(message)
+        self.cell: Optional[NotebookNode] = cell
+        # Every cell the tool call executed, ending with the interrupted one
+        self.executed: list = []
+
+
+def cell_time_limit(
+    cell: NotebookNode, default: Optional[float], deadline: Optional[float] = None
+) -> Optional[int]:
+    """Whole seconds a cell may run: its timeout metadata or else the default,
+    within what is left until the deadline of the tool call
+
+    Args:
+        cell: Cell about to run
+        default: Seconds a cell may run unless it sets its own limit, None or 0
+             for no limit
+        deadline: time.monotonic() value by which the tool call must end
+
+    Returns:
+        The limit, 0 if the deadline has passed or None for no limit
+    """
+    limit = cell.get("metadata", {}).get(TIMEOUT_METADATA_KEY, default)
+    if not isinstance(limit, numbers.Real) or isinstance(limit, bool) or limit <= 0:
+        limit = default or None
+    if deadline is not None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return 0
+        limit = remaining if limit is None else min(limit, remaining)
+    return None if limit is None else int(math.ceil(limit))
+
+
+class KernelSession:
+    """A live kernel bound to a single notebook, reused across tool calls.
+
+    The kernel client is tied to the event loop of the thread that started it,
+    so every kernel operation runs on a dedicated thread owned by the session.
+    """
+
+    def __init__(
+        self,
+        notebook_path: str,
+        timeout: int = DEFAULT_CELL_TIMEOUT,
+        registry: Optional["KernelSessionRegistry"] = None,
+    ) -> None:
+        self.notebook_path: str = notebook_path
+        # Seconds a cell may run unless it sets its own limit, 0 for no limit
+        self.timeout: int = timeout
+        self.registry: Optional["KernelSessionRegistry"] = registry
+        self.client: Optional["StreamingNotebookClient"] = None
+        self.executor: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix=f"kernel-{os.path.basename(notebook_path)}",
+            initializer=self._mark_thread,
+        )
+        self._thread_ident: Optional[int] = None
+        # Chain hashes of the cells run on the current kernel, see run_stale_cells
+        self.executed_chains: set[str] = set()
+        # Source hash of the last execution of each cell on the current kernel
+        self.executed_sources: dict[str, str] = {}
+        # Random per kernel start, so states of different kernels never match
+        self.kernel_nonce: str = ""
+        # When the session last had work, and how much work is queued or running
+        self.last_used: float = time.monotonic()
+        self._pending: int = 0
+        self._pending_lock = threading.Lock()
+        # Why the kernel was stopped or restarted behind the client's back
+        self._notices: list[str] = []
+        # Directory to move a pre-started spare kernel to once it is adopted
+        self._adopted_directory: Optional[str] = None
+        # What a restart or shutdown interrupting the running cell does
+        self._stopping: Optional[str] = None
+
+    def _mark_thread(self) -> None:
+        self._thread_ident = threading.get_ident()
+
+    def submit(self, func: Callable[..., T], *args: Any) -> "Future[T]":
+        """Queue func on the session thread"""
+        with self._pending_lock:
+            self._pending += 1
+            self.last_used = time.monotonic()
+        future = self.executor.submit(func, *args)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, _: Future) -> None:
+        with self._pending_lock:
+            self._pending -= 1
+            self.last_used = time.monotonic()
+
+    def run(self, func: Callable[..., T], *args: Any) -> T:
+        """Call func on the session thread and wait for its result"""
+        if threading.get_ident() == self._thread_ident:
+            return func(*args)
+        return self.submit(func, *args).result()
+
+    @property
+    def busy(self) -> bool:
+        """Whether work is queued or running on the session thread"""
+        return self._pending > 0
+
+    def drain_notices(self) -> list[str]:
+        """Take the reasons the kernel was stopped or restarted by the server
+        since the last call"""
+        with self._pending_lock:
+            notices, self._notices = self._notices, []
+        return notices
+
+    @property
+    def kernel_name(self) -> str:
+        """Name of the kernelspec the session kernel was started from"""
+        if self.client is None:
+            return ""
+        return self.client.kernel_name
+
+    def kernel_state(self, exclude_cell_id: str = "") -> str:
+        """Hash of the current kernel and which cell sources ran on it
+
+        Args:
+            exclude_cell_id: Cell whose own executions are left out
+        """
+        executed = sorted(
+            (cell_id, source_hash)
+            for cell_id, source_hash in self.executed_sources.items()
+            if cell_id != exclude_cell_id
+        )
+        return hashlib.sha256(repr((self.kernel_nonce, executed)).encode()).hexdigest()
+
+    @property
+    def is_alive(self) -> bool:
+        """Whether the session has a started kernel"""
+        return (
+            self.client is not None
+            and self.client.km is not None
+            and self.client.km.has_kernel
+        )
+
+    def _kernel_client(self) -> "AsyncKernelClient":
+        """Client of the started kernel, nbclient always makes an async one"""
+        assert self.client is not None and self.client.kc is not None
+        return cast("AsyncKernelClient", self.client.kc)
+
+    def start(self, notebook: NotebookNode) -> None:
+        """Start a kernel for the notebook if one is not running yet
+
+        Args:
+            notebook: Notebook whose kernelspec selects the kernel to start
+        """
+        self.run(self._start, notebook)
+
+    def _start(self, notebook: NotebookNode) -> None:
+        if self.is_alive and self._adopted_directory is None:
+            return
+
+        if self.registry is not None:
+            self.registry.make_room(self)
+        if self._adopted_directory is not None:
+            self._adopt(notebook)
+            if self.is_alive:
+                return
+
+        # nbclient and jupyter_client are slow to import, load them on first use
+        from mcp_server_jupyter.streaming_client import StreamingNotebookClient
+
+        client = StreamingNotebookClient(
+            notebook,
+            timeout=self.timeout,
+            interrupt_on_timeout=True,
+            resources={"metadata": {"path": os.path.dirname(self.notebook_path)}},
+        )
+        with kernel_startup_seconds.time():
+            client.km = client.create_kernel_manager()
+            client.start_new_kernel()
+            client.start_new_kernel_client()
+        self.client = client
+        self.executed_chains.clear()
+        self.executed_sources.clear()
+        self.kernel_nonce = os.urandom(8).hex()
+
+    def _adopt(self, notebook: NotebookNode) -> None:
+        """Take over the spare kernel this session was created from, or shut it
+        down if the notebook asks for another kernel"""
+        from jupyter_client.kernelspec import NATIVE_KERNEL_NAME
+        from nbclient.util import run_sync
+
+        directory, self._adopted_directory = self._adopted_directory, None
+        if not self.is_alive:
+            return
+        assert self.client is not None and self.client.km is not None
+        kernel_name = notebook.metadata.get("kernelspec", {}).get("name", "")
+        if (kernel_name or NATIVE_KERNEL_NAME) != self.client.km.kernel_name:
+            self._shutdown()
+            return
+
+        # The spare started in the server's directory, not the notebook's
+        self.client.kernel_name = kernel_name
+        run_sync(self._kernel_client().execute_interactive)(
+            f"__import__('os').chdir({directory!r})",
+            silent=True,
+            store_history=False,
+            timeout=self.timeout or None,
+        )
+
+    def rss(self) -> Optional[int]:
+        """Resident memory of the kernel process in bytes, where /proc has it"""
+        if not self.is_alive:
+            return None
+        assert self.client is not None
+        pid = getattr(getattr(self.client.km, "provisioner", None), "pid", None)
+        if pid is None:
+            return None
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        return None
+
+    def evict(self, reason: str, notice: str) -> None:
+        """Shut down the kernel to free its resources, keeping the session so
+        the next execution starts a new kernel
+
+        Args:
+            reason: Label of the kernel_stops_total metric
+            notice: Explanation given with the next execution on the session
+        """
+        self.run(self._evict, reason, notice)
+
+    def _evict(self, reason: str, notice: str) -> None:
+        if not self.is_alive:
+            return
+        self._shutdown()
+        kernel_stops.inc(reason)
+        with self._pending_lock:
+            self._notices.append(notice)
+
+    def enforce_memory_limit(self, max_rss: int) -> bool:
+        """Restart the kernel if its resident memory exceeds max_rss bytes
+
+        Returns:
+            True if the kernel was restarted
+        """
+        return self.run(self._enforce_memory_limit, max_rss)
+
+    def _enforce_memory_limit(self, max_rss: int) -> bool:
+        rss = self.rss()
+        if max_rss <= 0 or rss is None or rss <= max_rss:
+            return False
+
+        self._restart()
+        kernel_stops.inc("memory")
+        with self._pending_lock:
+            self._notices.append(
+                f"The kernel used {rss // 2**20} MB, over the limit of "
+                f"{max_rss // 2**20} MB, and was restarted; its state was lost."
+            )
+        return True
+
+    def execute_cell(
+        self,
+        notebook: NotebookNode,
+        cell: NotebookNode,
+        cell_index: int,
+        on_output: Optional[Callable[[dict[str, Any]], None]] = None,
+        deadline: Optional[float] = None,
+    ) -> NotebookNode:
+        """Execute a cell of the notebook on the session kernel
+
+        The kernel is interrupted if the cell runs out of time, see
+        cell_time_limit, or if the current tool call is cancelled.
+
+        Args:
+            notebook: Notebook the cell belongs to
+            cell: Cell to execute
+            cell_index: Position of the cell within the notebook
+            on_output: Optional callback receiving each output message of the
+                 cell while it runs
+            deadline: Optional time.monotonic() value by which the tool call
+                 must end
+
+        Returns:
+            The executed cell
+
+        Raises:
+            ExecutionInterrupted: If the cell was interrupted or never started
+        """
+        return self.run(
+            self._execute_cell, notebook, cell, cell_index, on_output, deadline
+        )
+
+    def _execute_cell(
+        self,
+        notebook: NotebookNode,
+        cell: NotebookNode,
+        cell_index: int,
+        on_output: Optional[Callable[[dict[str, Any]], None]],
+        deadline: Optional[float],
+    ) -> NotebookNode:
+        from nbclient.exceptions import CellExecutionError
+
+        cancellation = current_cancellation()
+        if cancellation.cancelled:
+            raise ExecutionInterrupted(
+                "The tool call was cancelled before the cell ran."
+            )
+        limit = cell_time_limit(cell, self.timeout, deadline)
+        if limit == 0:
+            raise ExecutionInterrupted(
+                "The tool call ran out of time before the cell ran."
+            )
+
+        self._start(notebook)
+        assert self.client is not None
+
+        self.client.nb = notebook
+        self.client.on_output = on_output
+        self.client.timeout = limit
+        self.client.error_on_timeout = {
+            "ename": TIMEOUT_ERROR_NAME,
+            "evalue": f"Cell execution timed out after {limit} seconds",
+            "traceback": [],
+        }
+        status = "error"
+        start = time.perf_counter()
+        try:
+            with cancellation.on_cancel(self.interrupt):
+                executed = self.client.execute_cell(cell, cell_index)
+            status = "ok"
+            return executed
+        except CellExecutionError as e:
+            if e.ename == TIMEOUT_ERROR_NAME:
+                status = "timeout"
+                raise ExecutionInterrupted(
+                    f"The cell ran out of its {limit} seconds and the kernel was "
+                    "interrupted; its outputs until then are kept.",
+                    cell,
+                ) from e
+            if cancellation.cancelled:
+                status = "cancelled"
+                raise ExecutionInterrupted(
+                    "The tool call was cancelled and the kernel was interrupted; "
+                    "the cell's outputs until then are kept.",
+                    cell,
+                ) from e
+            if self._stopping is not None:
+                status = "cancelled"
+                raise ExecutionInterrupted(
+                    f"The kernel was interrupted to be {self._stopping}; the "
+                    "cell's outputs until then are kept.",
+                    cell,
+                ) from e
+            raise
+        finally:
+            cell_execution_seconds.observe_duration(time.perf_counter() - start, status)
+            self.client.on_output = None
+            self.executed_sources[cell.get("id", "")] = hashlib.sha256(
+                cell.source.encode()
+            ).hexdigest()
+
+    def evaluate(self, expression: str, timeout: float = EVALUATE_TIMEOUT) -> str:
+        """Evaluate an expression in the namespace of the running kernel, as a
+        user expression of a silent request, so it leaves no trace in the
+        notebook, the kernel's history or its execution count
+
+        The kernel is interrupted if the expression runs out of time or the
+        current tool call is cancelled.
+
+        Args:
+            expression: Expression in the kernel's language
+            timeout: Seconds the evaluation may take
+
+        Returns:
+            The plain text representation of the value
+
+        Raises:
+            RuntimeError: If no kernel is running
+            ValueError: If the evaluation failed or ran out of time
+        """
+        return self.run(self._evaluate, expression, timeout)
+
+    def _evaluate(self, expression: str, timeout: float) -> str:
+        from nbclient.util import run_sync
+
+        if not self.is_alive:
+            raise RuntimeError("No kernel is running for this notebook.")
+
+        cancellation = current_cancellation()
+        try:
+            with cancellation.on_cancel(self.interrupt):
+                reply = run_sync(self._kernel_client().execute_interactive)(
+                    "",
+                    silent=True,
+                    store_history=False,
+                    user_expressions={"value": expression},
+                    timeout=timeout,
+                    # The default hook prints outputs, which stdout cannot take
+                    output_hook=lambda msg: None,
+                )
+        except TimeoutError:
+            self.interrupt()
+            raise ValueError(
+                f"The evaluation ran out of its {timeout:g} seconds and the kernel "
+                "was interrupted."
+            )
+
+        result = reply["content"].get("user_expressions", {}).get("value", {})
+        if result.get("status") != "ok":
+            raise ValueError(
+                f"{result.get('ename', 'Error')}: {result.get('evalue', '')}"
+            )
+        return result["data"]["text/plain"]
+
+    def interrupt(self) -> None:
+        """Interrupt the kernel, from a thread other than the session's"""
+        from nbclient.util import run_sync
+
+        client = self.client
+        if client is not None and client.km is not None:
+            run_sync(self._async_interrupt)(client.km)
+
+    @staticmethod
+    async def _async_interrupt(km: "KernelManager") -> None:
+        from nbclient.util import ensure_async
+
+        await ensure_async(km.interrupt_kernel())
+
+    def restart(self) -> None:
+        """Restart the kernel, dropping all of its state"""
+        self._interrupt_to("restarted")
+        self.run(self._restart)
+
+    def _interrupt_to(self, stopping: str) -> None:
+        # A running cell holds the session thread, stop it so the restart or
+        # shutdown does not wait for the cell to end or time out
+        if self.busy:
+            self._stopping = stopping
+            self.interrupt()
+
+    def _restart(self) -> None:
+        from nbclient.util import run_sync
+
+        self._stopping = None
+        if not self.is_alive:
+            return
+        assert self.client is not None
+
+        run_sync(self._async_restart)()
+        self.client.reset_execution_trackers()
+        self.executed_chains.clear()
+        self.executed_sources.clear()
+        self.kernel_nonce = os.urandom(8).hex()
+
+    async def _async_restart(self) -> None:
+        from nbclient.util import ensure_async
+
+        assert self.client is not None and self.client.km is not None
+        await ensure_async(self.client.km.restart_kernel(now=True))
+        if self.client.kc is not None:
+            await self._kernel_client().wait_for_ready(
+                timeout=self.client.startup_timeout
+            )
+
+    def shutdown(self) -> None:
+        """Shut down the kernel and release its resources"""
+        self._interrupt_to("shut down")
+        self.run(self._shutdown)
+        self.executor.shutdown(wait=False)
+
+    def _shutdown(self) -> None:
+        self._stopping = None
+        if self.client is None:
+            return
+
+        if self.client.km is not None:
+            self.client._cleanup_kernel()
+        self.client = None
+
+
+class KernelSessionRegistry:
+    """Keeps one kernel session per notebook path, within resource limits.
+
+    At most max_kernels kernels run at once, the least recently used idle one
+    being shut down to start another. Kernels idle for idle_timeout seconds are
+    shut down and kernels whose resident memory exceeds max_rss bytes are
+    restarted. A shut down kernel is started again by the next execution on
+    its notebook. With spare set, a kernel is started ahead of time for the
+    next notebook to use. Limits of 0 are disabled.
+    """
+
+    def __init__(
+        self,
+        max_kernels: int = 0,
+        idle_timeout: float = 0,
+        max_rss: int = 0,
+        spare: bool = False,
+        check_interval: float = 10.0,
+        cell_timeout: int = DEFAULT_CELL_TIMEOUT,
+    ) -> None:
+        self.max_kernels: int = max_kernels
+        self.idle_timeout: float = idle_timeout
+        self.max_rss: int = max_rss
+        self.spare: bool = spare
+        self.check_interval: float = check_interval
+        # Seconds a cell may run unless it sets its own limit, 0 for no limit
+        self.cell_timeout: int = cell_timeout
+        self._sessions: dict[str, KernelSession] = {}
+        self._spare: Optional[tuple[KernelSession, Future]] = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._reaper: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    @property
+    def live_kernels(self) -> int:
+        """Number of notebook kernels running, not counting the spare"""
+        return sum(session.is_alive for session in list(self._sessions.values()))
+
+    def configure(
+        self,
+        max_kernels: int,
+        idle_timeout: float,
+        max_rss: int,
+        spare: bool,
+        cell_timeout: int = DEFAULT_CELL_TIMEOUT,
+    ) -> None:
+        """Set the resource limits and start enforcing them
+
+        Args:
+            max_kernels: Maximum number of kernels running at once
+            idle_timeout: Seconds after which an unused kernel is shut down
+            max_rss: Resident memory in bytes above which a kernel is restarted
+            spare: Keep a kernel started ahead of time for the next notebook
+            cell_timeout: Seconds a cell may run before its kernel is
+                 interrupted, unless the cell sets its own limit
+        """
+        if max_kernels < 0 or idle_timeout < 0 or max_rss < 0 or cell_timeout < 0:
+            raise ValueError("Kernel limits cannot be negative")
+
+        self.cell_timeout = cell_timeout
+        self.max_kernels = max_kernels
+        self.idle_timeout = idle_timeout
+        self.max_rss = max_rss
+        self.spare = spare
+        if spare:
+            self._start_spare()
+        if (idle_timeout or max_rss) and self._reaper is None:
+            self._stopped.clear()
+            self._reaper = threading.Thread(
+                target=self._reap, name="kernel-reaper", daemon=True
+            )
+            self._reaper.start()
+
+    def get(self, notebook_path: str) -> KernelSession:
+        """Get the session of a notebook, creating it if needed"""
+        path = os.path.realpath(notebook_path)
+        with self._lock:
+            if path not in self._sessions:
+                self._sessions[path] = self._adopt_spare(path) or KernelSession(
+                    path, timeout=self.cell_timeout, registry=self
+                )
+            return self._sessions[path]
+
+    def find(self, notebook_path: str) -> Optional[KernelSession]:
+        """Get the session of a notebook if one exists"""
+        return self._sessions.get(os.path.realpath(notebook_path))
+
+    def make_room(self, starting: KernelSession) -> None:
+        """Shut down the least recently used idle kernels until another one
+        fits within max_kernels
+
+        Busy kernels are never shut down, so the limit may be exceeded while
+        they all run.
+        """
+        with self._lock:
+            # The spare does not count, it only runs until it is adopted
+            if self.max_kernels <= 0 or starting not in self._sessions.values():
+                return
+            live = [
+                session
+                for session in self._sessions.values()
+                if session is not starting and session.is_alive
+            ]
+            idle = sorted(
+                (session for session in live if not session.busy),
+                key=lambda session: session.last_used,
+            )
+            victims = idle[: len(live) + 1 - self.max_kernels]
+        for victim in victims:
+            victim.evict(
+                "lru",
+                f"The kernel was shut down to make room for another notebook's "
+                f"kernel, as at most {self.max_kernels} may run at once; a new "
+                "kernel was started and earlier state was lost.",
+            )
+
+    def enforce_memory_limit(self, session: KernelSession) -> bool:
+        """Restart the kernel of a session if it uses more memory than max_rss
+
+        Returns:
+            True if the kernel was restarted
+        """
+        return session.enforce_memory_limit(self.max_rss)
+
+    def shutdown(self, notebook_path: str) -> bool:
+        """Shut down the kernel of a notebook
+
+        Returns:
+            True if a session existed and was shut down, False otherwise
+        """
+        with self._lock:
+            session = self._sessions.pop(os.path.realpath(notebook_path), None)
+        if session is None:
+            return False
+
+        session.shutdown()
+        return True
+
+    def shutdown_all(self) -> None:
+        """Shut down every live kernel, including the spare"""
+        self._stopped.set()
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+            if self._spare is not None:
+                sessions.append(self._spare[0])
+                self._spare = None
+        for session in sessions:
+            session.shutdown()
+
+    def _reap(self) -> None:
+        while not self._stopped.wait(self.check_interval):
+            now = time.monotonic()
+            for session in list(self._sessions.values()):
+                if session.busy or not session.is_alive:
+                    continue
+                if 0 < self.idle_timeout < now - session.last_used:
+                    session.evict(
+                        "idle",
+                        f"The kernel was shut down after {self.idle_timeout:g} "
+                        "seconds without use; a new kernel was started and "
+                        "earlier state was lost.",
+                    )
+                elif 0 < self.max_rss < (session.rss() or 0):
+                    # Checked here first, as work on the session marks it used
+                    session.enforce_memory_limit(self.max_rss)
+
+    def _start_spare(self) -> None:
+        """Start a kernel for the next new session, in the background"""
+        if not self.spare or self._spare is not None or self._stopped.is_set():
+            return
+        # The spare starts from the server's directory with the default kernel
+        session = KernelSession(
+            os.path.join(os.getcwd(), "spare"),
+            timeout=self.cell_timeout,
+            registry=self,
+        )
+        future = session.submit(session._start, nbformat.v4.new_notebook())
+        self._spare = (session, future)
+
+    def _adopt_spare(self, path: str) -> Optional[KernelSession]:
+        """Hand the spare kernel over to a new session of a notebook, starting
+        another spare in its place"""
+        if self._spare is None:
+            return None
+
+        session, future = self._spare
+        self._spare = None
+        self._start_spare()
+        if future.done() and future.exception() is not None:
+            session.shutdown()
+            return None
+
+        # The kernel moves to the notebook's directory on its first execution
+        session.notebook_path = path
+        session._adopted_directory = os.path.dirname(path)
+        session.last_used = time.monotonic()
+        return session
+
+
+kernel_sessions = KernelSessionRegistry()
+
+metrics.gauge(
+    "jupyter_kernel_sessions",
+    "Notebooks with a kernel session",
+    lambda: len(kernel_sessions),
+)
+metrics.gauge(
+    "jupyter_live_kernels",
+    "Notebook kernels running, not counting the spare",
+    lambda: kernel_sessions.live_kernels,
+)
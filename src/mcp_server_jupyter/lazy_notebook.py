@@ -0,0 +1,331 @@
+import itertools
+import json
+import mmap
+import os
+import re
+from typing import Iterator, Optional
+
+import nbformat
+from nbformat import NotebookNode
+from nbformat.v4.rwbase import rejoin_lines
+
+from mcp_server_jupyter.notebook_cache import file_version
+from mcp_server_jupyter.notebook_cell import NotebookCell
+
+# Bytes that open, close or quote a JSON container or string
+_STRUCTURE = re.compile(rb'["\[\]{}]')
+# Further strings of a list of strings, like the lines of a text output
+_STRING_RUN = re.compile(rb'(?:\s*,\s*"[^"\\]*(?:\\.[^"\\]*)*")*', re.DOTALL)
+# An array of strings laid out one per line, like sources and text outputs
+_LINE_LIST = re.compile(rb'\[\n *"')
+# Any container laid out one item per line
+_MULTILINE = re.compile(rb"[\[{]\n")
+# Largest indented container whose brackets are counted to skip it in one go,
+# larger ones are mostly long strings, which are fast to step over anyway
+_MAX_COUNTED = 256 * 1024
+_WHITESPACE = re.compile(rb"[ \t\r\n]*")
+# Numbers, true, false and null
+_SCALAR = re.compile(rb"[^,\]}\s]+")
+
+_QUOTE = ord('"')
+_BACKSLASH = ord("\\")
+_OPENERS = (ord("["), ord("{"))
+_CLOSERS = {ord("["): b"]", ord("{"): b"}"}
+
+
+class UnsupportedNotebook(ValueError):
+    """The notebook cannot be read lazily and has to be parsed in full"""
+
+
+class _Scanner:
+    """Finds the extent of JSON values in a buffer without decoding them"""
+
+    def __init__(self, buffer: mmap.mmap) -> None:
+        self.buffer = buffer
+
+    def skip_whitespace(self, pos: int) -> int:
+        match = _WHITESPACE.match(self.buffer, pos)
+        # The pattern also matches no whitespace
+        assert match is not None
+        return match.end()
+
+    def expect(self, pos: int, char: bytes) -> int:
+        pos = self.skip_whitespace(pos)
+        if self.buffer[pos : pos + 1] != char:
+            raise UnsupportedNotebook(f"Expected {char.decode()!r} at byte {pos}")
+        return pos + 1
+
+    def string_end(self, pos: int) -> int:
+        """Position after the closing quote of the string starting at pos"""
+        end = pos + 1
+        while True:
+            end = self.buffer.find(b'"', end)
+            if end < 0:
+                raise UnsupportedNotebook(f"Unterminated string at byte {pos}")
+            # The quote is escaped if an odd number of backslashes precede it
+            escape = end - 1
+            while self.buffer[escape] == _BACKSLASH:
+                escape -= 1
+            end += 1
+            if (end - 2 - escape) % 2 == 0:
+                return end
+
+    def value_end(self, pos: int) -> int:
+        """Position after the value starting at pos"""
+        first = self.buffer[pos]
+        if first == _QUOTE:
+            return self.string_end(pos)
+        if first not in _OPENERS:
+            match = _SCALAR.match(self.buffer, pos)
+            if match is None:
+                raise UnsupportedNotebook(f"Expected a value at byte {pos}")
+            return match.end()
+
+        depth = 0
+        while True:
+            match = _STRUCTURE.search(self.buffer, pos)
+            if match is None:
+                raise UnsupportedNotebook(f"Unterminated value at byte {pos}")
+            pos = match.start()
+            if self.buffer[pos] == _QUOTE:
+                # Long strings are skipped with find, which is far faster than
+                # a regex, and the short lines that follow them with one match
+                pos = self.string_end(pos)
+                run = _STRING_RUN.match(self.buffer, pos)
+                assert run is not None
+                pos = run.end()
+                continue
+            if _MULTILINE.match(self.buffer, pos):
+                # Indented containers, like outputs and lists of lines, in one go
+                end = self._indented_end(pos)
+                if end is not None:
+                    pos = end
+                    if depth == 0:
+                        return pos
+                    continue
+            depth += 1 if self.buffer[pos] in _OPENERS else -1
+            pos += 1
+            if depth == 0:
+                return pos
+
+    def _indented_end(self, pos: int) -> Optional[int]:
+        """Position after the container opening at pos, if it is laid out one
+        item per line like json.dumps with an indent, and so nbformat, writes it
+
+        JSON only has raw newlines between tokens, so such a container closes
+        on the first line indented as much as the one it opens on, as long as
+        no line in between is indented less.
+        """
+        line_start = self.buffer.rfind(b"\n", 0, pos) + 1
+        line = self.buffer[line_start:pos]
+        indent = len(line) - len(line.lstrip(b" "))
+        closing = b"\n" + b" " * indent + _CLOSERS[self.buffer[pos]]
+        # Strings cannot hold a raw newline, so no container can nest in a
+        # list of lines, while other containers have their brackets counted
+        lines = _LINE_LIST.match(self.buffer, pos) is not None
+        limit = len(self.buffer) if lines else pos + _MAX_COUNTED
+
+        # The first line indented no deeper than the opening one must close it
+        outdented = re.compile(rb"\n {0,%d}(?! )" % indent).search(
+            self.buffer, pos, limit
+        )
+        if outdented is None:
+            return None
+        end = outdented.start() + len(closing)
+        if self.buffer[end - len(closing) : end] != closing:
+            return None
+        if lines:
+            return end
+
+        # Containers nested in an unusual layout could close on that line
+        # instead, which would leave the brackets unbalanced
+        skipped = self.buffer[pos:end]
+        opened = skipped.count(b"[") + skipped.count(b"{")
+        if opened != skipped.count(b"]") + skipped.count(b"}"):
+            return None
+        return end
+
+    def members(self, pos: int) -> Iterator[tuple[str, int, int]]:
+        """Keys and value extents of the object starting at pos, one at a time"""
+        pos = self.skip_whitespace(self.expect(pos, b"{"))
+        if self.buffer[pos : pos + 1] == b"}":
+            return
+
+        while True:
+            pos = self.skip_whitespace(pos)
+            if self.buffer[pos : pos + 1] != b'"':
+                raise UnsupportedNotebook(f"Expected a key at byte {pos}")
+            key_end = self.string_end(pos)
+            key = json.loads(self.buffer[pos:key_end])
+            start = self.skip_whitespace(self.expect(key_end, b":"))
+            end = self.value_end(start)
+            yield key, start, end
+
+            pos = self.skip_whitespace(end)
+            if self.buffer[pos : pos + 1] == b"}":
+                return
+            pos = self.expect(pos, b",")
+
+    def find_member(self, pos: int, name: str) -> Optional[int]:
+        """Start of the value of a key of the object starting at pos, without
+        finding where that value ends"""
+        pos = self.skip_whitespace(self.expect(pos, b"{"))
+        if self.buffer[pos : pos + 1] == b"}":
+            return None
+
+        while True:
+            pos = self.skip_whitespace(pos)
+            if self.buffer[pos : pos + 1] != b'"':
+                raise UnsupportedNotebook(f"Expected a key at byte {pos}")
+            key_end = self.string_end(pos)
+            start = self.skip_whitespace(self.expect(key_end, b":"))
+            if json.loads(self.buffer[pos:key_end]) == name:
+                return start
+
+            pos = self.skip_whitespace(self.value_end(start))
+            if self.buffer[pos : pos + 1] == b"}":
+                return None
+            pos = self.expect(pos, b",")
+
+    def objects(self, pos: int) -> Iterator[tuple[int, list[tuple[str, int, int]]]]:
+        """Start and members of each object in the array starting at pos, one
+        at a time"""
+        pos = self.skip_whitespace(self.expect(pos, b"["))
+        if self.buffer[pos : pos + 1] == b"]":
+            return
+
+        while True:
+            start = self.skip_whitespace(pos)
+            members = list(self.members(start))
+            if members:
+                end = self.expect(members[-1][2], b"}")
+            else:
+                end = self.expect(self.expect(start, b"{"), b"}")
+            yield start, members
+
+            pos = self.skip_whitespace(end)
+            if self.buffer[pos : pos + 1] == b"]":
+                return
+            pos = self.expect(pos, b",")
+
+
+class LazyNotebook:
+    """Read-only view of a notebook file that decodes cells on demand.
+
+    The file is memory-mapped and only the structure of its JSON is scanned,
+    so outputs that are not asked for are skipped over without being decoded
+    and the cost of a source-only read follows the size of the sources. Only
+    nbformat 4 notebooks whose cells all have IDs can be read this way, others
+    raise UnsupportedNotebook. Use it as a context manager, or call close, so
+    the map does not keep the file open.
+    """
+
+    def __init__(self, notebook_path: str) -> None:
+        self.notebook_path: str = notebook_path
+        with open(notebook_path, "rb") as f:
+            try:
+                self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise UnsupportedNotebook(f"Notebook {notebook_path} is empty")
+            self.version: str = file_version(os.fstat(f.fileno()))
+        self._scanner = _Scanner(self._buffer)
+        # ID and (key, value start, value end) of the fields of each cell,
+        # filled in as the cells are scanned
+        self._cells: list[tuple[str, list[tuple[str, int, int]]]] = []
+        self._scanned: Optional[Iterator[tuple[str, list[tuple[str, int, int]]]]] = (
+            self._scan_cells()
+        )
+
+    def close(self) -> None:
+        """Unmap the file, after which no further cell can be read"""
+        self._buffer.close()
+
+    def __enter__(self) -> "LazyNotebook":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    @property
+    def cell_count(self) -> int:
+        self._scan_until(None)
+        return len(self._cells)
+
+    def iter_notebook_details(
+        self, start: int = 0, stop: Optional[int] = None, with_outputs: bool = True
+    ) -> Iterator[NotebookCell]:
+        """Parse the cells in a range of positions one at a time
+
+        Args:
+            start: Position of the first cell
+            stop: Position after the last cell (None for the end of the notebook)
+            with_outputs: Parse cell outputs if True
+        """
+        for position in itertools.islice(itertools.count(), start, stop):
+            if not self._scan_until(position):
+                return
+            yield NotebookCell.from_dict(
+                self._read_cell(position, with_outputs), with_outputs=with_outputs
+            )
+
+    def get_cell_by_index(self, cell_index: int) -> NotebookNode:
+        """Get a cell by its index, without its outputs"""
+        if cell_index < 0 or not self._scan_until(cell_index):
+            raise ValueError(f"Cell index {cell_index} is out of range")
+        return self._read_cell(cell_index, with_outputs=False)
+
+    def get_cell_by_id(self, cell_id: str) -> NotebookNode:
+        """Get a cell by its unique ID, with its outputs"""
+        return self._read_cell(self.get_cell_position(cell_id), with_outputs=True)
+
+    def get_cell_position(self, cell_id: str) -> int:
+        """Get the index of a cell by its unique ID, scanning no further than it"""
+        for position, (scanned_id, _) in enumerate(self._cells):
+            if scanned_id == cell_id:
+                return position
+
+        while self._scan_until(len(self._cells)):
+            if self._cells[-1][0] == cell_id:
+                return len(self._cells) - 1
+        raise ValueError(f"No cell found with ID {cell_id}")
+
+    def _scan_until(self, position: Optional[int]) -> bool:
+        """Scan cells up to position (None for all of them)
+
+        Returns:
+            Whether the notebook has a cell at position
+        """
+        while self._scanned is not None and (
+            position is None or len(self._cells) <= position
+        ):
+            cell = next(self._scanned, None)
+            if cell is None:
+                self._scanned = None
+            else:
+                self._cells.append(cell)
+        return position is None or position < len(self._cells)
+
+    def _scan_cells(self) -> Iterator[tuple[str, list[tuple[str, int, int]]]]:
+        scanner = self._scanner
+        # Older formats keep cells under worksheets, only nbformat 4 has cells
+        cells = scanner.find_member(0, "cells")
+        if cells is None:
+            raise UnsupportedNotebook("Not an nbformat 4 notebook")
+
+        for start, members in scanner.objects(cells):
+            id_member = next((m for m in members if m[0] == "id"), None)
+            if id_member is None:
+                # nbformat would make up random IDs, which only a full read keeps
+                raise UnsupportedNotebook(f"Cell at byte {start} has no ID")
+            yield json.loads(self._buffer[id_member[1] : id_member[2]]), members
+
+    def _read_cell(self, position: int, with_outputs: bool) -> NotebookNode:
+        cell = {}
+        for key, value_start, value_end in self._cells[position][1]:
+            if key == "outputs" and not with_outputs:
+                cell[key] = []
+            else:
+                cell[key] = json.loads(self._buffer[value_start:value_end])
+
+        # Join multiline sources and outputs the way nbformat.read does
+        return rejoin_lines(nbformat.from_dict({"cells": [cell]})).cells[0]
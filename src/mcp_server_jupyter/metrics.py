@@ -0,0 +1,344 @@
+import contextvars
+import json
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, Optional, TextIO
+
+# Upper bounds of the buckets of duration histograms, in seconds
+DURATION_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    300.0,
+)
+
+# Upper bounds of the buckets of size histograms, in bytes
+SIZE_BUCKETS = tuple(float(4**exponent * 256) for exponent in range(1, 12))
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    escaped = (
+        value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        for value in values
+    )
+    return (
+        "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+    )
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """Monotonically increasing count, per combination of label values"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        self.name: str = name
+        self.help: str = help
+        self.labels: tuple[str, ...] = labels
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> Iterator[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            labels = _format_labels(self.labels, label_values)
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+
+class Gauge:
+    """Current value of something, read when the metrics are rendered"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, read: Callable[[], float]) -> None:
+        self.name: str = name
+        self.help: str = help
+        self.read: Callable[[], float] = read
+
+    def render(self) -> Iterator[str]:
+        yield f"{self.name} {_format_value(self.read())}"
+
+
+class Histogram:
+    """Distribution of observed values over fixed buckets, per combination of
+    label values"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DURATION_BUCKETS,
+    ) -> None:
+        self.name: str = name
+        self.help: str = help
+        self.labels: tuple[str, ...] = labels
+        self.buckets: tuple[float, ...] = buckets
+        # Per label values: count of each bucket (not cumulative), then sum
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(
+                label_values, ([0] * (len(self.buckets) + 1), [0.0])
+            )
+            counts[index] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, *label_values: str) -> Iterator[None]:
+        """Observe the duration of a block, also adding it to the trace of the
+        current tool call"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_duration(time.perf_counter() - start, *label_values)
+
+    def observe_duration(self, seconds: float, *label_values: str) -> None:
+        """Observe a duration, also adding it to the trace of the current tool
+        call"""
+        self.observe(seconds, *label_values)
+        call = _current_call.get()
+        if call is not None:
+            call.add_span(self.name, seconds)
+
+    def render(self) -> Iterator[str]:
+        with self._lock:
+            values = sorted(
+                (labels, (list(counts), total[0]))
+                for labels, (counts, total) in self._values.items()
+            )
+        for label_values, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                labels = _format_labels(
+                    (*self.labels, "le"), (*label_values, _format_value(bound))
+                )
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labels, label_values)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class MetricsRegistry:
+    """Collection of metrics, rendered in the Prometheus text format"""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Counter | Gauge | Histogram] = {}
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, read: Callable[[], float]) -> Gauge:
+        return self._register(Gauge(name, help, read))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DURATION_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+
+@dataclass
+class ToolCall:
+    """A tool call being traced"""
+
+    tool: str
+    notebook_path: Optional[str]
+    response_bytes: int = 0
+    # Total seconds spent in each timed operation during the call
+    spans: dict[str, float] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add_span(self, name: str, duration: float) -> None:
+        with self._lock:
+            self.spans[name] = self.spans.get(name, 0.0) + duration
+
+
+# The tool call whose handler is running, propagated to dispatcher threads
+_current_call: contextvars.ContextVar[Optional[ToolCall]] = contextvars.ContextVar(
+    "current_tool_call", default=None
+)
+
+
+class TraceLog:
+    """Structured log of tool calls, one JSON object per line.
+
+    Disabled until opened.
+    """
+
+    def __init__(self) -> None:
+        self._file: Optional[TextIO] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self._file is not None
+
+    def open(self, path: str) -> None:
+        """Append traces to a file, or to stderr if path is "-" """
+        self.close()
+        self._file = sys.stderr if path == "-" else open(path, "a", buffering=1)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None and self._file is not sys.stderr:
+                self._file.close()
+            self._file = None
+
+    def write(self, record: dict) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.write(json.dumps(record) + "\n")
+
+
+metrics = MetricsRegistry()
+trace_log = TraceLog()
+
+tool_calls = metrics.counter(
+    "mcp_tool_calls_total", "Tool calls by tool and outcome", ("tool", "status")
+)
+tool_call_seconds = metrics.histogram(
+    "mcp_tool_call_duration_seconds", "Duration of tool calls", ("tool",)
+)
+tool_response_bytes = metrics.histogram(
+    "mcp_tool_response_bytes",
+    "Size of tool call responses",
+    ("tool",),
+    buckets=SIZE_BUCKETS,
+)
+notebook_cache_lookups = metrics.counter(
+    "notebook_cache_lookups_total", "Notebook cache lookups by result", ("result",)
+)
+notebook_load_seconds = metrics.histogram(
+    "notebook_load_duration_seconds",
+    "Time to get a notebook ready for a tool, from the cache or the disk",
+)
+notebook_parse_seconds = metrics.histogram(
+    "notebook_parse_duration_seconds", "Time to read and parse a notebook file"
+)
+notebook_parse_bytes = metrics.histogram(
+    "notebook_parse_bytes", "Size of parsed notebook files", buckets=SIZE_BUCKETS
+)
+notebook_save_seconds = metrics.histogram(
+    "notebook_save_duration_seconds",
+    "Time a tool spends saving a notebook, which excludes write-behind writes",
+)
+notebook_write_seconds = metrics.histogram(
+    "notebook_write_duration_seconds", "Time to serialise and write a notebook file"
+)
+notebook_scan_seconds = metrics.histogram(
+    "notebook_scan_duration_seconds",
+    "Time to scan a notebook file lazily for a source-only or single-cell read",
+)
+execution_cache_lookups = metrics.counter(
+    "execution_cache_lookups_total", "Execution cache lookups by result", ("result",)
+)
+kernel_startup_seconds = metrics.histogram(
+    "kernel_startup_duration_seconds", "Time to start a kernel and connect to it"
+)
+kernel_stops = metrics.counter(
+    "kernel_stops_total",
+    "Kernels stopped or restarted by the server to bound their resources, by reason",
+    ("reason",),
+)
+cell_execution_seconds = metrics.histogram(
+    "cell_execution_duration_seconds",
+    "Time to execute a cell on a kernel, by outcome",
+    ("status",),
+)
+
+
+@contextmanager
+def record_tool_call(tool: str, notebook_path: Optional[str]) -> Iterator[ToolCall]:
+    """Record the metrics of a tool call, and trace it if the trace log is open
+
+    Operations timed while the call runs, in any thread it dispatches work
+    to, are added to its trace.
+    """
+    call = ToolCall(tool=tool, notebook_path=notebook_path)
+    token = _current_call.set(call)
+    status = "ok"
+    error = None
+    start = time.perf_counter()
+    try:
+        yield call
+    except BaseException as e:
+        status = "error"
+        error = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        _current_call.reset(token)
+        tool_calls.inc(tool, status)
+        tool_call_seconds.observe(duration, tool)
+        if status == "ok":
+            tool_response_bytes.observe(call.response_bytes, tool)
+        if trace_log.enabled:
+            trace_log.write(
+                {
+                    "timestamp": time.time(),
+                    "tool": tool,
+                    "notebook_path": notebook_path,
+                    "status": status,
+                    "error": error,
+                    "duration_ms": round(duration * 1000, 3),
+                    "response_bytes": call.response_bytes,
+                    "spans_ms": {
+                        name: round(seconds * 1000, 3)
+                        for name, seconds in call.spans.items()
+                    },
+                }
+            )
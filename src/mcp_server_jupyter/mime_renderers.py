@@ -0,0 +1,397 @@
+import itertools
+import json
+import numbers
+import re
+from html.parser import HTMLParser
+from typing import Any, Callable, Optional
+
+import mcp.types as types
+
+from mcp_server_jupyter.image_processing import image_reducer
+
+Content = types.TextContent | types.ImageContent
+Renderer = Callable[[Any], Optional[Content]]
+
+# Items of JSON objects and arrays, and levels of nesting, kept in summaries
+MAX_JSON_ITEMS = 20
+MAX_JSON_DEPTH = 4
+# Characters kept of a table cell or a JSON string
+MAX_CELL_CHARS = 40
+MAX_STRING_CHARS = 200
+# Text labels listed for an SVG image
+MAX_SVG_LABELS = 50
+
+# A repr like <IPython.core.display.HTML object> stands for a richer type
+_OBJECT_REPR = re.compile(r"<[^<>\n]*>")
+_SVG_ROOT = re.compile(r"<svg\b[^>]*>", re.IGNORECASE)
+_SVG_LABEL = re.compile(
+    r"<(text|title)\b[^>]*>(.*?)</\1\s*>", re.IGNORECASE | re.DOTALL
+)
+_SVG_ELEMENT = re.compile(r"<[a-zA-Z]")
+_TAG = re.compile(r"<[^>]*>")
+
+_BLOCK_TAGS = {"br", "div", "p", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6"}
+
+
+def _text(value: Any) -> str:
+    return "".join(value) if isinstance(value, list) else str(value)
+
+
+def _shorten(text: str, limit: int) -> str:
+    return text if len(text) <= limit else f"{text[: limit - 3]}..."
+
+
+class _HTMLText(HTMLParser):
+    """Rows of the tables of an HTML document, and its text outside of them"""
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        # Header rows and body rows of each top-level table
+        self.tables: list[tuple[list[list[str]], list[list[str]]]] = []
+        self.text: list[str] = []
+        self._tables_open = 0
+        self._in_head = False
+        self._row: Optional[list[str]] = None
+        self._cell: Optional[list[str]] = None
+        self._colspan = 1
+        self._hidden = 0
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, Optional[str]]]) -> None:
+        if tag in ("style", "script"):
+            self._hidden += 1
+        elif tag == "table":
+            self._tables_open += 1
+            if self._tables_open == 1:
+                self.tables.append(([], []))
+        elif self._tables_open != 1:
+            if tag in _BLOCK_TAGS and not self._tables_open:
+                self.text.append("\n")
+        elif tag == "thead":
+            self._in_head = True
+        elif tag == "tr":
+            self._row = []
+        elif tag in ("td", "th") and self._row is not None:
+            self._cell = []
+            colspan = dict(attrs).get("colspan") or "1"
+            self._colspan = int(colspan) if colspan.isdigit() else 1
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in ("style", "script"):
+            self._hidden = max(self._hidden - 1, 0)
+        elif tag == "table":
+            self._tables_open = max(self._tables_open - 1, 0)
+            if not self._tables_open:
+                self._end_row()
+                self.text.append("\n")
+        elif self._tables_open != 1:
+            return
+        elif tag == "thead":
+            self._in_head = False
+        elif tag in ("td", "th"):
+            self._end_cell()
+        elif tag == "tr":
+            self._end_row()
+
+    def handle_data(self, data: str) -> None:
+        if self._hidden:
+            return
+        if self._cell is not None:
+            self._cell.append(data)
+        elif not self._tables_open:
+            self.text.append(data)
+
+    def _end_cell(self) -> None:
+        if self._cell is None or self._row is None:
+            return
+        text = " ".join("".join(self._cell).split())
+        # Spanning cells fill their columns, so the cells after them line up
+        self._row.extend([_shorten(text, MAX_CELL_CHARS)] + [""] * (self._colspan - 1))
+        self._cell = None
+
+    def _end_row(self) -> None:
+        self._end_cell()
+        if self._row:
+            header, body = self.tables[-1]
+            (header if self._in_head else body).append(self._row)
+        self._row = None
+
+    def plain_text(self) -> str:
+        lines = (" ".join(line.split()) for line in "".join(self.text).split("\n"))
+        return "\n".join(line for line in lines if line)
+
+
+class MimeRenderers:
+    """Registry picking how rich outputs are returned to clients.
+
+    Each MIME type of an output bundle can have renderers, tried in order of
+    registration until one returns content. They favour the cheapest faithful
+    form: HTML tables become compact text tables, large JSON and Plotly
+    figures become summaries, and the plain text of objects that have richer
+    representations is skipped. Rendered text is cut to max_chars, 0 for no
+    limit.
+    """
+
+    def __init__(
+        self, max_chars: int = 20000, max_rows: int = 20, max_columns: int = 20
+    ) -> None:
+        self.max_chars: int = max_chars
+        self.max_rows: int = max_rows
+        self.max_columns: int = max_columns
+        self._renderers: list[tuple[str, Renderer]] = []
+
+        self.register("image/png", self._render_image("image/png"))
+        self.register("image/jpeg", self._render_image("image/jpeg"))
+        self.register("text/html", self._render_html_tables)
+        self.register("text/latex", _text_content)
+        self.register("text/markdown", _text_content)
+        self.register("application/vnd.plotly.v1+json", self._render_plotly)
+        self.register("application/json", self._render_json)
+        self.register("text/plain", self._render_plain_text)
+        self.register("text/html", self._render_html_text)
+        self.register("image/svg+xml", self._render_svg)
+
+    def register(
+        self, mime_type: str, renderer: Renderer, before: Optional[str] = None
+    ) -> None:
+        """Add a renderer for a MIME type
+
+        Args:
+            mime_type: MIME type the renderer handles
+            renderer: Function taking the output data of that type and
+                 returning its content, or None to leave it to later renderers
+            before: Optional MIME type whose first renderer this one is tried
+                 before, by default it is tried after all others
+        """
+        position = len(self._renderers)
+        if before is not None:
+            position = next(
+                (
+                    number
+                    for number, (registered, _) in enumerate(self._renderers)
+                    if registered == before
+                ),
+                position,
+            )
+        self._renderers.insert(position, (mime_type, renderer))
+
+    def render(self, data: dict[str, Any]) -> Content:
+        """Content of a display_data or execute_result output, from its MIME
+        bundle"""
+        return self.render_with_type(data)[1]
+
+    def render_with_type(self, data: dict[str, Any]) -> tuple[Optional[str], Content]:
+        """Content of an output like render, and the MIME type of the bundle it
+        was rendered from, None if the output was omitted"""
+        for mime_type, renderer in self._renderers:
+            if mime_type in data:
+                content = renderer(data[mime_type])
+                if content is not None:
+                    return mime_type, self._cap(content)
+
+        if "text/plain" in data:
+            return "text/plain", self._cap(_text_content(data["text/plain"]))
+        json_type = next((mime for mime in data if mime.endswith("+json")), None)
+        if json_type is not None:
+            return json_type, self._cap(self._render_json(data[json_type]))
+        return None, types.TextContent(
+            type="text", text=f"[Output of type {', '.join(data) or 'none'} omitted]"
+        )
+
+    def _cap(self, content: Content) -> Content:
+        if not isinstance(content, types.TextContent):
+            return content
+        text = content.text
+        if self.max_chars <= 0 or len(text) <= self.max_chars:
+            return content
+        return types.TextContent(
+            type="text",
+            text=f"{text[: self.max_chars]}\n[... output truncated, "
+            f"{len(text) - self.max_chars} more characters]",
+        )
+
+    @staticmethod
+    def _render_image(mime_type: str) -> Renderer:
+        def render(data: Any) -> Content:
+            image_data, image_type = image_reducer.reduce(_text(data), mime_type)
+            # Validation keeps the base64 payload as is, without a copy
+            return types.ImageContent(
+                type="image", data=image_data, mimeType=image_type
+            )
+
+        return render
+
+    def _render_plain_text(self, data: Any) -> Optional[Content]:
+        text = _text(data)
+        # Leave reprs of display objects to the richer types next to them
+        if text.startswith("<") and _OBJECT_REPR.fullmatch(text.strip()):
+            return None
+        return types.TextContent(type="text", text=text)
+
+    def _render_html_tables(self, data: Any) -> Optional[Content]:
+        html = _text(data)
+        if "<table" not in html and "<TABLE" not in html:
+            return None
+        parsed = _HTMLText()
+        parsed.feed(html)
+        parsed.close()
+        tables = [self._format_table(*table) for table in parsed.tables if any(table)]
+        if not tables:
+            return None
+        return _text_content("\n\n".join([*tables, parsed.plain_text()]).strip())
+
+    def _render_html_text(self, data: Any) -> Optional[Content]:
+        parsed = _HTMLText()
+        parsed.feed(_text(data))
+        parsed.close()
+        text = parsed.plain_text()
+        return _text_content(text) if text else None
+
+    def _format_table(self, header: list[list[str]], body: list[list[str]]) -> str:
+        columns = max(len(row) for row in header + body)
+        rows = header + self._limit(body, self.max_rows, ["..."] * columns)
+        lines = [
+            " | ".join(
+                self._limit(row + [""] * (columns - len(row)), self.max_columns, "...")
+            )
+            for row in rows
+        ]
+        if len(body) > self.max_rows > 0 or columns > self.max_columns > 0:
+            lines.append(f"[table of {len(body)} rows x {columns} columns, shortened]")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _limit(items: list, limit: int, filler: Any) -> list:
+        """The first and last items of a list, around filler, if it is longer
+        than limit"""
+        if limit <= 0 or len(items) <= limit:
+            return items
+        head = (limit + 1) // 2
+        return [*items[:head], filler, *items[len(items) - (limit - head) :]]
+
+    def _render_json(self, data: Any) -> Content:
+        if isinstance(data, str):
+            try:
+                data = json.loads(data)
+            except ValueError:
+                return _text_content(data)
+        text = json.dumps(data)
+        # Keep fewer items of each array and object until the summary fits
+        items = MAX_JSON_ITEMS
+        while len(text) > self.max_chars > 0 and items:
+            text = json.dumps(_summarize_json(data, items))
+            items //= 2
+        return _text_content(text)
+
+    def _render_plotly(self, data: Any) -> Optional[Content]:
+        if not isinstance(data, dict):
+            return None
+        layout = data.get("layout") or {}
+        lines = [f"Plotly figure {_plotly_title(layout.get('title'))}".rstrip()]
+        axes = [
+            f"{name}: {_plotly_title(value.get('title'))}"
+            for name, value in layout.items()
+            if re.fullmatch(r"[xyz]axis\d*", name)
+            and isinstance(value, dict)
+            and value.get("title")
+        ]
+        if axes:
+            lines.append(", ".join(axes))
+
+        traces = data.get("data") or []
+        for number, trace in enumerate(traces[:MAX_JSON_ITEMS], start=1):
+            if isinstance(trace, dict):
+                lines.append(f"Trace {number}: {_plotly_trace(trace)}")
+        if len(traces) > MAX_JSON_ITEMS:
+            lines.append(f"... {len(traces) - MAX_JSON_ITEMS} more traces")
+        return _text_content("\n".join(lines))
+
+    def _render_svg(self, data: Any) -> Optional[Content]:
+        # No SVG rasterizer is among the dependencies, so describe the image
+        svg = _text(data)
+        root = _SVG_ROOT.search(svg)
+        size = ""
+        if root is not None:
+            attributes = dict(re.findall(r'(\w+)="([^"]*)"', root.group()))
+            if "width" in attributes and "height" in attributes:
+                size = f" {attributes['width']} x {attributes['height']}"
+            elif "viewBox" in attributes:
+                size = f" viewBox {attributes['viewBox']}"
+
+        labels = []
+        for _, label in _SVG_LABEL.findall(svg):
+            label = " ".join(_TAG.sub("", label).split())
+            if label and label not in labels:
+                labels.append(_shorten(label, MAX_CELL_CHARS))
+        text = f"[SVG image{size}, {len(_SVG_ELEMENT.findall(svg))} elements"
+        if labels:
+            text += f", text: {', '.join(labels[:MAX_SVG_LABELS])}"
+            if len(labels) > MAX_SVG_LABELS:
+                text += f" and {len(labels) - MAX_SVG_LABELS} more"
+        return _text_content(text + "]")
+
+
+def _text_content(data: Any) -> types.TextContent:
+    return types.TextContent(type="text", text=_text(data))
+
+
+def _summarize_json(value: Any, items: int, depth: int = 0) -> Any:
+    """A JSON value with arrays and objects cut to a number of items, and
+    long strings and deep nesting cut short"""
+    if isinstance(value, dict):
+        if depth >= MAX_JSON_DEPTH:
+            return f"{{... {len(value)} keys}}"
+        summary = {
+            key: _summarize_json(item, items, depth + 1)
+            for key, item in itertools.islice(value.items(), items)
+        }
+        if len(value) > items:
+            summary["..."] = f"{len(value) - items} more keys"
+        return summary
+    if isinstance(value, list):
+        if depth >= MAX_JSON_DEPTH:
+            return f"[... {len(value)} items]"
+        summary = [_summarize_json(item, items, depth + 1) for item in value[:items]]
+        if len(value) > items:
+            summary.append(f"... {len(value) - items} more items")
+        return summary
+    if isinstance(value, str) and len(value) > MAX_STRING_CHARS:
+        return f"{value[:MAX_STRING_CHARS]}... ({len(value)} characters)"
+    return value
+
+
+def _plotly_title(title: Any) -> str:
+    if isinstance(title, dict):
+        title = title.get("text")
+    return f'"{_shorten(str(title), MAX_STRING_CHARS)}"' if title else ""
+
+
+def _plotly_trace(trace: dict[str, Any]) -> str:
+    description = str(trace.get("type", "scatter"))
+    if trace.get("name"):
+        description += f' "{_shorten(str(trace["name"]), MAX_CELL_CHARS)}"'
+
+    points = next(
+        (
+            len(trace[key])
+            for key in ("x", "y", "values", "z")
+            if isinstance(trace.get(key), list)
+        ),
+        None,
+    )
+    if points is not None:
+        description += f", {points} points"
+    for key in ("x", "y", "z", "values"):
+        values = trace.get(key)
+        if not isinstance(values, list):
+            continue
+        numeric = [
+            value
+            for value in values
+            if isinstance(value, numbers.Real) and not isinstance(value, bool)
+        ]
+        if numeric:
+            description += f", {key} from {min(numeric):g} to {max(numeric):g}"
+    return description
+
+
+mime_renderers = MimeRenderers()
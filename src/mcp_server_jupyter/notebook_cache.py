@@ -0,0 +1,192 @@
+import os
+import secrets
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+import nbformat
+from nbformat import NotebookNode
+
+from mcp_server_jupyter.metrics import (
+    notebook_cache_lookups,
+    notebook_parse_bytes,
+    notebook_parse_seconds,
+)
+from mcp_server_jupyter.notebook_history import notebook_history
+
+# (st_mtime_ns, st_size, st_ino) of the file the notebook was parsed from
+FileKey = tuple[int, int, int]
+
+
+def _file_key(stat: os.stat_result) -> FileKey:
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def _key_version(key: FileKey) -> str:
+    return "{:x}-{:x}-{:x}".format(*key)
+
+
+def file_version(stat: os.stat_result) -> str:
+    """Version token of a notebook as read from a file"""
+    return _key_version(_file_key(stat))
+
+
+def new_version() -> str:
+    """Version token of a notebook saved by the server"""
+    return secrets.token_hex(8)
+
+
+@dataclass
+class CachedNotebook:
+    notebook: NotebookNode
+    key: FileKey
+    nbytes: int
+    # Maps cell IDs to their position in notebook.cells, kept by NotebookManager
+    cell_index: Optional[dict[str, int]] = None
+    # Changes whenever the notebook does, see NotebookManager.version
+    version: str = ""
+
+
+class NotebookCache:
+    """Process-wide cache of parsed notebooks, validated against the file on disk.
+
+    Cached notebooks are shared between callers: a caller that modifies one
+    must either save it through ``store`` or drop it with ``invalidate``.
+    """
+
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024) -> None:
+        self.max_bytes: int = max_bytes
+        self._entries: OrderedDict[str, CachedNotebook] = OrderedDict()
+        self._total_bytes: int = 0
+        self._lock = threading.Lock()
+
+    def load(self, notebook_path: str) -> CachedNotebook:
+        """Get the parsed notebook at a path, reading it only if it changed on disk
+
+        Args:
+            notebook_path: Path to the notebook
+
+        Returns:
+            The cache entry holding the parsed notebook
+        """
+        path = os.path.realpath(notebook_path)
+        key = _file_key(os.stat(path))
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.key == key:
+                self._entries.move_to_end(path)
+                notebook_cache_lookups.inc("hit")
+                return entry
+
+        notebook_cache_lookups.inc("miss")
+        with open(path) as f, notebook_parse_seconds.time():
+            key = _file_key(os.fstat(f.fileno()))
+            notebook = nbformat.read(f, as_version=4)
+        notebook_parse_bytes.observe(key[1])
+
+        entry = CachedNotebook(
+            notebook=notebook,
+            key=key,
+            nbytes=key[1],
+            version=_key_version(key),
+        )
+        self._put(path, entry)
+        return entry
+
+    def store(
+        self,
+        notebook_path: str,
+        notebook: NotebookNode,
+        cell_index: Optional[dict[str, int]] = None,
+    ) -> str:
+        """Record a notebook that was just written to a path
+
+        Args:
+            notebook_path: Path the notebook was written to
+            notebook: The notebook that was written
+            cell_index: Optional cell ID to position map of the notebook
+
+        Returns:
+            The new version token of the notebook
+        """
+        path = os.path.realpath(notebook_path)
+        version = new_version()
+        try:
+            key = _file_key(os.stat(path))
+        except FileNotFoundError:
+            self.invalidate(path)
+            return version
+
+        self._put(
+            path,
+            CachedNotebook(
+                notebook=notebook,
+                key=key,
+                nbytes=key[1],
+                cell_index=cell_index,
+                version=version,
+            ),
+        )
+        return version
+
+    def refresh(self, notebook_path: str, notebook: NotebookNode, version: str) -> None:
+        """Revalidate a cached notebook against a file it was just written to,
+        keeping its version
+
+        Args:
+            notebook_path: Path the notebook was written to
+            notebook: The notebook that was written
+            version: Version store gave the notebook
+        """
+        path = os.path.realpath(notebook_path)
+        key = _file_key(os.stat(path))
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.notebook is notebook:
+                self._total_bytes += key[1] - entry.nbytes
+                entry.key = key
+                entry.nbytes = key[1]
+
+        # The file now holds this version, so the history of the notebook goes
+        # on when it is read again from the file, even once evicted
+        notebook_history.record(path, version, _key_version(key), changed=())
+
+    def is_cached(self, notebook_path: str) -> bool:
+        """Whether a notebook of the path is in the cache, valid or not"""
+        return os.path.realpath(notebook_path) in self._entries
+
+    def invalidate(self, notebook_path: str) -> None:
+        """Drop the cached notebook of a path, if any"""
+        path = os.path.realpath(notebook_path)
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is not None:
+                self._total_bytes -= entry.nbytes
+
+    def clear(self) -> None:
+        """Drop every cached notebook"""
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def _put(self, path: str, entry: CachedNotebook) -> None:
+        with self._lock:
+            previous = self._entries.pop(path, None)
+            if previous is not None:
+                self._total_bytes -= previous.nbytes
+
+            if entry.nbytes > self.max_bytes:
+                return
+
+            self._entries[path] = entry
+            self._total_bytes += entry.nbytes
+
+            # Evict least recently used notebooks until we are within budget
+            while self._total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= evicted.nbytes
+
+
+notebook_cache = NotebookCache()
@@ -1,101 +1,222 @@
+import base64
 import json
-from dataclasses import dataclass
-from typing import Any
+from typing import Any, Mapping, Optional
 
 import mcp.types as types
+import nbformat
+
+from mcp_server_jupyter.mime_renderers import mime_renderers
+from mcp_server_jupyter.output_store import output_store
+from mcp_server_jupyter.stream_output import stream_compactor
+
+Content = types.TextContent | types.ImageContent | types.EmbeddedResource
+
+
+def _text_content(text: Any) -> types.TextContent:
+    if isinstance(text, list):
+        text = "".join(text)
+    return types.TextContent(type="text", text=text)
 
 
-@dataclass
 class CellOutput:
-    output: types.TextContent | types.ImageContent | types.EmbeddedResource
+    """An output of a cell, converted to MCP content on first access.
+
+    Holds a reference to the output node of the notebook, so outputs that
+    are never returned to the client cost nothing more than this object.
+    """
+
+    __slots__ = ("output_data", "_output")
+
+    def __init__(self, output_data: Mapping[str, Any]) -> None:
+        self.output_data: Mapping[str, Any] = output_data
+        self._output: Optional[Content] = None
+
+    @property
+    def output(self) -> Content:
+        """The output as MCP content.
+
+        Outputs above the output store threshold are replaced by a reference.
+        """
+        if self._output is None:
+            content, mime_type = self._parse_output(self.output_data)
+            if output_store.threshold > 0:
+                content = output_store.offload(
+                    content, *self._payload(self.output_data, content, mime_type)
+                )
+            self._output = content
+        return self._output
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, CellOutput):
+            return NotImplemented
+        return self.output == other.output
+
+    def __repr__(self) -> str:
+        return f"CellOutput(output={self.output!r})"
 
     @classmethod
-    def from_dict(cls, output_data: dict[str, Any]) -> "CellOutput":
+    def from_dict(cls, output_data: Mapping[str, Any]) -> "CellOutput":
         """Create CellOutput from notebook output dictionary."""
+        return cls(output_data)
+
+    @staticmethod
+    def _parse_output(output_data: Mapping[str, Any]) -> tuple[Content, Optional[str]]:
+        """Content of an output, and the MIME type of the bundle it was
+        rendered from for display_data and execute_result outputs"""
         output_type = output_data.get("output_type")
 
         # Handle different output types
         if output_type == "display_data" or output_type == "execute_result":
-            data = output_data.get("data", {})
-
-            # Handle image output
-            if "image/png" in data:
-                return CellOutput(
-                    output=types.ImageContent(
-                        type="image",
-                        data=data["image/png"],
-                        mimeType="image/png",
-                    )
-                )
-
-            # Handle text/plain output
-            elif "text/plain" in data:
-                return CellOutput(
-                    output=types.TextContent(
-                        type="text",
-                        text=data["text/plain"],
-                    )
-                )
-
-            return CellOutput(
-                output=types.TextContent(
-                    type="text",
-                    text=str(data),
-                )
+            # Images are reduced to the size budget, other types rendered to
+            # their most compact text, see MimeRenderers
+            mime_type, content = mime_renderers.render_with_type(
+                output_data.get("data", {})
             )
+            return content, mime_type
 
         elif output_type == "stream":
-            return CellOutput(
-                output=types.TextContent(
-                    type="text",
-                    text=output_data.get("text", ""),
-                )
-            )
+            return _text_content(
+                stream_compactor.compact_text(output_data.get("text", ""))
+            ), None
 
         elif output_type == "error":
-            return CellOutput(
-                output=types.TextContent(
-                    type="text",
-                    text=json.dumps(
-                        {
-                            "ename": output_data.get("ename", ""),
-                            "evalue": output_data.get("evalue", ""),
-                            "traceback": output_data.get("traceback", []),
-                        }
-                    ),
+            return _text_content(
+                json.dumps(
+                    {
+                        "ename": output_data.get("ename", ""),
+                        "evalue": output_data.get("evalue", ""),
+                        "traceback": output_data.get("traceback", []),
+                    }
                 )
-            )
+            ), None
+
+        return _text_content(str(output_data)), None
+
+    @staticmethod
+    def _payload(
+        output_data: Mapping[str, Any], content: Content, mime_type: Optional[str]
+    ) -> tuple[bytes, str]:
+        """Original payload of an output and its MIME type, which the output
+        store keeps instead of the content returned inline"""
+        # Rich outputs are stored as in the bundle, before images are reduced
+        # and text is cut, see MimeRenderers
+        value = output_data.get("data", {}).get(mime_type) if mime_type else None
+        if mime_type is not None and value is not None:
+            if isinstance(value, list):
+                value = "".join(value)
+            if not isinstance(value, str):
+                return json.dumps(value).encode(), mime_type
+            # nbformat keeps binary types, all images but SVG, in base64
+            if mime_type.startswith("image/") and mime_type != "image/svg+xml":
+                return base64.b64decode(value), mime_type
+            return value.encode(), mime_type
+        # Streams are stored before they are compacted, see StreamCompactor
+        if output_data.get("output_type") == "stream":
+            text = output_data.get("text", "")
+            if isinstance(text, list):
+                text = "".join(text)
+            return text.encode(), "text/plain"
+        if isinstance(content, types.TextContent):
+            return content.text.encode(), "text/plain"
+        return b"", "text/plain"
 
-        return CellOutput(
-            output=types.TextContent(
-                type="text",
-                text=str(output_data),
+    @classmethod
+    def from_message(cls, msg: dict[str, Any]) -> "CellOutput":
+        """Create CellOutput from a kernel iopub output message."""
+        if msg["msg_type"] == "update_display_data":
+            return cls.from_dict(
+                {"output_type": "display_data", "data": msg["content"]["data"]}
             )
-        )
+        return cls.from_dict(nbformat.v4.output_from_msg(msg))
 
 
-@dataclass
 class NotebookCell:
-    cell_id: str
-    cell_type: str
-    content: str
-    outputs: list[CellOutput]
-    execution_count: int | None = None
-    metadata: dict[str, Any] | None = None
+    """A cell of a notebook whose source is joined and outputs are wrapped
+    only when first accessed"""
+
+    __slots__ = (
+        "cell_id",
+        "cell_type",
+        "execution_count",
+        "metadata",
+        "_source",
+        "_output_data",
+        "_outputs",
+    )
+
+    def __init__(
+        self,
+        cell_id: str,
+        cell_type: str,
+        source: str | list[str],
+        output_data: list[dict[str, Any]],
+        execution_count: int | None = None,
+        metadata: dict[str, Any] | None = None,
+    ) -> None:
+        self.cell_id: str = cell_id
+        self.cell_type: str = cell_type
+        self.execution_count: int | None = execution_count
+        self.metadata: dict[str, Any] | None = metadata
+        self._source: str | list[str] = source
+        self._output_data: list[dict[str, Any]] = output_data
+        self._outputs: Optional[list[CellOutput]] = None
+
+    @property
+    def content(self) -> str:
+        if not isinstance(self._source, str):
+            self._source = "".join(self._source)
+        return self._source
+
+    @property
+    def outputs(self) -> list[CellOutput]:
+        if self._outputs is None:
+            self._outputs = [
+                CellOutput(output)
+                for output in stream_compactor.merge(self._output_data)
+            ]
+        return self._outputs
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, NotebookCell):
+            return NotImplemented
+        return self._fields() == other._fields()
+
+    def __repr__(self) -> str:
+        fields = zip(
+            ("cell_id", "cell_type", "content", "outputs", "execution_count"),
+            self._fields(),
+        )
+        return f"NotebookCell({', '.join(f'{k}={v!r}' for k, v in fields)})"
+
+    def _fields(self) -> tuple:
+        return (
+            self.cell_id,
+            self.cell_type,
+            self.content,
+            self.outputs,
+            self.execution_count,
+            self.metadata,
+        )
 
     @classmethod
-    def from_dict(cls, cell_data: dict[str, Any]) -> "NotebookCell":
-        """Create NotebookCell from notebook cell dictionary."""
-        outputs = []
-        if cell_data.get("cell_type") == "code":
-            for output in cell_data.get("outputs", []):
-                outputs.append(CellOutput.from_dict(output))
+    def from_dict(
+        cls, cell_data: dict[str, Any], with_outputs: bool = True
+    ) -> "NotebookCell":
+        """Create NotebookCell from notebook cell dictionary.
+
+        Outputs are left empty when with_outputs is False. The cell keeps the
+        source and the list of outputs it had at this point, even if the node
+        is changed afterwards.
+        """
+        output_data = []
+        if with_outputs and cell_data.get("cell_type") == "code":
+            output_data = cell_data.get("outputs", [])
 
         return cls(
             cell_id=cell_data.get("id", ""),
             cell_type=cell_data.get("cell_type", ""),
-            content="".join(cell_data.get("source", [])),
-            outputs=outputs,
+            source=cell_data.get("source", ""),
+            output_data=output_data,
             execution_count=cell_data.get("execution_count"),
             metadata=cell_data.get("metadata"),
         )
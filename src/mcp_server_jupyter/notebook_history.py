@@ -0,0 +1,115 @@
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+# Saves remembered per notebook, and notebooks remembered
+MAX_VERSIONS = 256
+MAX_NOTEBOOKS = 256
+
+
+@dataclass
+class NotebookChanges:
+    """Cells of a notebook changed between two of its versions"""
+
+    # IDs of cells added, edited, moved or executed
+    changed: set[str] = field(default_factory=set)
+    # IDs of cells removed
+    removed: set[str] = field(default_factory=set)
+
+
+@dataclass
+class _Save:
+    previous: str
+    # None if the save changed the notebook in ways that were not tracked
+    changed: Optional[frozenset[str]]
+    removed: frozenset[str]
+
+
+class NotebookHistory:
+    """Which cells each save of a notebook changed, by the version it made.
+
+    Lets a client that read a notebook at some version fetch only the cells
+    changed since. Only the latest saves of the most recently saved notebooks
+    are kept, and a notebook changed outside the server starts over from the
+    version of its file, so older versions become unknown.
+    """
+
+    def __init__(
+        self, max_versions: int = MAX_VERSIONS, max_notebooks: int = MAX_NOTEBOOKS
+    ) -> None:
+        self.max_versions: int = max_versions
+        self.max_notebooks: int = max_notebooks
+        self._saves: OrderedDict[str, OrderedDict[str, _Save]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        notebook_path: str,
+        previous: str,
+        version: str,
+        changed: Optional[Iterable[str]],
+        removed: Iterable[str] = (),
+    ) -> None:
+        """Record a save of a notebook
+
+        Args:
+            notebook_path: Path of the notebook
+            previous: Version of the notebook the changes were made to
+            version: Version the save gave the notebook
+            changed: IDs of the cells added, edited, moved or executed, or None
+                 if the changes are not known
+            removed: IDs of the cells removed
+        """
+        path = os.path.realpath(notebook_path)
+        save = _Save(
+            previous=previous,
+            changed=None if changed is None else frozenset(changed),
+            removed=frozenset(removed),
+        )
+        with self._lock:
+            saves = self._saves.pop(path, None) or OrderedDict()
+            self._saves[path] = saves
+            saves[version] = save
+            while len(saves) > self.max_versions:
+                saves.popitem(last=False)
+            while len(self._saves) > self.max_notebooks:
+                self._saves.popitem(last=False)
+
+    def changes_since(
+        self, notebook_path: str, since: str, version: str
+    ) -> Optional[NotebookChanges]:
+        """Cells changed from one version of a notebook to a later one
+
+        Args:
+            notebook_path: Path of the notebook
+            since: Version a client read
+            version: Current version of the notebook
+
+        Returns:
+            The changes, or None if the history does not lead from since to
+            version
+        """
+        path = os.path.realpath(notebook_path)
+        # Changed and removed cells of each save, from the latest
+        saves: list[tuple[frozenset[str], frozenset[str]]] = []
+        with self._lock:
+            recorded = self._saves.get(path, {})
+            while version != since:
+                save = recorded.get(version)
+                # Each save is passed at most once, whatever the tokens
+                if save is None or save.changed is None or len(saves) == len(recorded):
+                    return None
+                saves.append((save.changed, save.removed))
+                version = save.previous
+
+        changes = NotebookChanges()
+        for changed, removed in reversed(saves):
+            changes.changed |= changed
+            changes.changed -= removed
+            changes.removed |= removed
+        return changes
+
+
+notebook_history = NotebookHistory()
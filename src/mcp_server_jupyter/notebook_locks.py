@@ -0,0 +1,101 @@
+import os
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import Iterator
+
+
+class ReadWriteLock:
+    """Lock shared by any number of readers or held by a single writer.
+
+    Waiting writers go before new readers so a stream of reads cannot starve
+    them. A thread may take the lock again while it holds it, and may read
+    while it writes, but not write while it reads.
+    """
+
+    def __init__(self) -> None:
+        self._condition = threading.Condition(threading.Lock())
+        self._readers: dict[int, int] = {}
+        self._writer: int = 0
+        self._writes: int = 0
+        self._waiting_writers: int = 0
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        me = threading.get_ident()
+        with self._condition:
+            # Holders go ahead of waiting writers, or they would wait on themselves
+            if self._writer != me and me not in self._readers:
+                while self._writes or self._waiting_writers:
+                    self._condition.wait()
+            self._readers[me] = self._readers.get(me, 0) + 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers[me] -= 1
+                if not self._readers[me]:
+                    del self._readers[me]
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer != me:
+                if me in self._readers:
+                    raise RuntimeError("Cannot write to a notebook while reading it")
+                self._waiting_writers += 1
+                try:
+                    while self._writes or self._readers:
+                        self._condition.wait()
+                finally:
+                    self._waiting_writers -= 1
+                self._writer = me
+            self._writes += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writes -= 1
+                if not self._writes:
+                    self._writer = 0
+                    self._condition.notify_all()
+
+
+class NotebookLocks:
+    """A reader/writer lock per notebook path.
+
+    Reads of a notebook run in parallel while a change to it runs alone, and
+    notebooks at different paths never wait on each other. Locks are dropped
+    once no thread uses them.
+    """
+
+    def __init__(self) -> None:
+        self._locks: weakref.WeakValueDictionary[str, ReadWriteLock] = (
+            weakref.WeakValueDictionary()
+        )
+        self._lock = threading.Lock()
+
+    def _get(self, notebook_path: str) -> ReadWriteLock:
+        path = os.path.realpath(notebook_path)
+        with self._lock:
+            lock = self._locks.get(path)
+            if lock is None:
+                lock = self._locks[path] = ReadWriteLock()
+            return lock
+
+    @contextmanager
+    def read(self, notebook_path: str) -> Iterator[None]:
+        """Hold the notebook against changes while in the block"""
+        with self._get(notebook_path).read():
+            yield
+
+    @contextmanager
+    def write(self, notebook_path: str) -> Iterator[None]:
+        """Hold the notebook alone while changing it in the block"""
+        with self._get(notebook_path).write():
+            yield
+
+
+notebook_locks = NotebookLocks()
@@ -1,18 +1,99 @@
+import copy
+import hashlib
+import itertools
 import json
-from typing import Any, Dict, Optional
+import os
+from typing import Any, Callable, Dict, Iterator, Optional
 
 import nbformat
-from nbclient import NotebookClient
 from nbformat import NotebookNode
 
+from mcp_server_jupyter.cancellation import current_cancellation
+from mcp_server_jupyter.execution_cache import (
+    NO_CACHE_TAG,
+    execution_cache,
+    execution_key,
+)
+from mcp_server_jupyter.kernel_session import (
+    DEFAULT_CELL_TIMEOUT,
+    ExecutionInterrupted,
+    KernelSession,
+    cell_time_limit,
+)
+from mcp_server_jupyter.metrics import (
+    notebook_load_seconds,
+    notebook_parse_seconds,
+    notebook_save_seconds,
+)
+from mcp_server_jupyter.notebook_cache import file_version, notebook_cache
 from mcp_server_jupyter.notebook_cell import NotebookCell
+from mcp_server_jupyter.notebook_history import notebook_history
+from mcp_server_jupyter.notebook_writer import notebook_writer
+from mcp_server_jupyter.stream_output import stream_compactor
+
+# Cell metadata key under which execution bookkeeping is stored
+METADATA_KEY = "mcp_server_jupyter"
+
+
+def chain_hash(upstream_hash: str, source: str) -> str:
+    """Hash a code cell's source together with the hash of the code cells above it"""
+    return hashlib.sha256(f"{upstream_hash}\0{source}".encode()).hexdigest()
+
+
+def _shallow_copy(node: NotebookNode, **replaced: Any) -> NotebookNode:
+    """Copy the top level of a node, replacing some of its values"""
+    copied = NotebookNode()
+    # Bypass NotebookNode.__setitem__, which would convert every value again
+    dict.update(copied, node)
+    dict.update(copied, replaced)
+    return copied
 
 
 class NotebookManager:
-    def __init__(self, notebook_path: str) -> None:
+    def __init__(self, notebook_path: str, cached: bool = True) -> None:
+        """Load a notebook
+
+        Args:
+            notebook_path: Path to the notebook
+            cached: Share the notebook through the notebook cache. If False,
+                 the notebook is read into a private copy, e.g. to execute it
+                 and save the result elsewhere
+        """
         self.notebook_path: str = notebook_path
-        with open(notebook_path) as f:
-            self.notebook: NotebookNode = nbformat.read(f, as_version=4)
+        # IDs of the cells executed on a copy, see copy_for_execution
+        self.executed_cell_ids: list[str] = []
+        # IDs of the cells changed and removed since the notebook was loaded
+        # or saved, for notebook_history; None once changes go untracked
+        self._changed_cell_ids: Optional[set[str]] = set()
+        self._removed_cell_ids: set[str] = set()
+        with notebook_load_seconds.time():
+            self._load(cached)
+
+    def _load(self, cached: bool) -> None:
+        # A write-behind save is only visible through the cache, so once its
+        # entry is gone the file on disk must be brought up to date first
+        if not cached or not notebook_cache.is_cached(self.notebook_path):
+            notebook_writer.flush(self.notebook_path)
+
+        if not cached:
+            with open(self.notebook_path) as f, notebook_parse_seconds.time():
+                self.notebook: NotebookNode = nbformat.read(f, as_version=4)
+                # Token a client passes back to change the notebook only if it
+                # did not change since, see notebook_cache.CachedNotebook
+                self.version: str = file_version(os.fstat(f.fileno()))
+            self._cell_index: dict[str, int] = self._build_cell_index()
+            return
+
+        entry = notebook_cache.load(self.notebook_path)
+        self.notebook = entry.notebook
+        self.version = entry.version
+        if entry.cell_index is None:
+            entry.cell_index = self._build_cell_index()
+        self._cell_index = entry.cell_index
+
+    @property
+    def cell_count(self) -> int:
+        return len(self.notebook.cells)
 
     def get_notebook_details(self) -> list[NotebookCell]:
         """Get details of the notebook"""
@@ -20,6 +101,19 @@ class NotebookManager:
 
         return self.parse_notebook_nodes(self.notebook)
 
+    def iter_notebook_details(
+        self, start: int = 0, stop: Optional[int] = None, with_outputs: bool = True
+    ) -> Iterator[NotebookCell]:
+        """Parse the cells in a range of positions one at a time
+
+        Args:
+            start: Position of the first cell
+            stop: Position after the last cell (None for the end of the notebook)
+            with_outputs: Parse cell outputs if True
+        """
+        for cell_data in itertools.islice(self.notebook.cells, start, stop):
+            yield NotebookCell.from_dict(cell_data, with_outputs=with_outputs)
+
     def get_cell_by_index(self, cell_index: int) -> NotebookNode:
         """Get a cell by its index"""
         if not 0 <= cell_index < len(self.notebook.cells):
@@ -30,13 +124,25 @@ class NotebookManager:
 
     def get_cell_by_id(self, cell_id: str) -> NotebookNode:
         """Get a cell by its unique ID"""
-        try:
-            # Find cell by ID
-            return next(
-                cell for cell in self.notebook.cells if cell.get("id") == cell_id
-            )
-        except StopIteration:
+        return self.notebook.cells[self.get_cell_position(cell_id)]
+
+    def get_cell_position(self, cell_id: str) -> int:
+        """Get the index of a cell by its unique ID"""
+        cell_index = self._cell_index.get(cell_id)
+        cells = self.notebook.cells
+
+        # The cell list may have been replaced or reordered behind our back
+        if (
+            cell_index is None
+            or cell_index >= len(cells)
+            or cells[cell_index].get("id") != cell_id
+        ):
+            self._rebuild_cell_index()
+            cell_index = self._cell_index.get(cell_id)
+
+        if cell_index is None:
             raise ValueError(f"No cell found with ID {cell_id}")
+        return cell_index
 
     def add_cell(
         self, cell_type: str = "code", source: str = "", position: int = -1
@@ -65,11 +171,15 @@ class NotebookManager:
             raise ValueError(f"Unsupported cell type: {cell_type}")
 
         if position == -1 or position >= len(self.notebook.cells):
+            position = len(self.notebook.cells)
             self.notebook.cells.append(new_cell)
         else:
+            position = max(0, position + len(self.notebook.cells) * (position < 0))
             self.notebook.cells.insert(position, new_cell)
 
-        return len(self.notebook.cells) - 1
+        self._reindex_cells_from(position)
+        self._mark_changed(new_cell.get("id"))
+        return position
 
     def remove_cell(self, id: str) -> bool:
         """Remove cell by a specific id.
@@ -82,14 +192,18 @@ class NotebookManager:
             True if cell was found and removed, False otherwise
         """
         try:
-            # Get index by cell ID
-            cell = self.get_cell_by_id(id)
-            cell_index = self.notebook.cells.index(cell)
-            self.notebook.cells.pop(cell_index)
-            return True
-        except StopIteration:
+            cell_index = self.get_cell_position(id)
+        except ValueError:
             return False
 
+        self.notebook.cells.pop(cell_index)
+        del self._cell_index[id]
+        self._reindex_cells_from(cell_index)
+        if self._changed_cell_ids is not None:
+            self._changed_cell_ids.discard(id)
+        self._removed_cell_ids.add(id)
+        return True
+
     def update_cell_source(self, id: str, new_source: str) -> bool:
         """Update source in a cell specified by its ID.
 
@@ -101,54 +215,228 @@ class NotebookManager:
             True if cell was found and updated, False if cell wasn't found
         """
         try:
-            # Find cell by ID
             cell = self.get_cell_by_id(id)
+        except ValueError:
+            return False
+
+        cell.source = new_source
+        self._mark_changed(id)
+        return True
 
-            cell.source = new_source
-            return True
+    def move_cell(self, id: str, position: int) -> bool:
+        """Move a cell specified by its ID to a new position.
+
+        Args:
+            id: The unique identifier of the cell to move
+            position: Index the cell should end up at (-1 for end)
 
-        except StopIteration:
+        Returns:
+            True if cell was found and moved, False if cell wasn't found
+        """
+        try:
+            cell_index = self.get_cell_position(id)
+        except ValueError:
             return False
 
+        cells = self.notebook.cells
+        cell = cells.pop(cell_index)
+        if position == -1 or position >= len(cells):
+            position = len(cells)
+        else:
+            position = max(0, position + len(cells) * (position < 0))
+        cells.insert(position, cell)
+
+        self._reindex_cells_from(min(cell_index, position))
+        self._mark_changed(id)
+        return True
+
+    def apply_operations(self, operations: list[Dict[str, Any]]) -> list[str]:
+        """Apply a list of cell operations, all of them or none.
+
+        Each operation is a dictionary with an "op" key and its arguments:
+            - add: cell_type (default "code"), source, position (default -1)
+            - edit: cell_id, source
+            - remove: cell_id
+            - move: cell_id, position
+
+        Args:
+            operations: Operations to apply, in order
+
+        Returns:
+            A description of the result of each operation
+
+        Raises:
+            ValueError: If any operation is invalid, after rolling back the
+                 operations that were already applied
+        """
+        for number, operation in enumerate(operations, start=1):
+            self._check_operation(number, operation)
+
+        cells_before = list(self.notebook.cells)
+        sources_before: dict[int, tuple[NotebookNode, Any]] = {}
+        results = []
+        number = 0
+
+        try:
+            for number, operation in enumerate(operations, start=1):
+                op = operation.get("op")
+                cell_id = operation.get("cell_id", "")
+
+                if op == "add":
+                    position = self.add_cell(
+                        cell_type=operation.get("cell_type", "code"),
+                        source=operation.get("source", ""),
+                        position=operation.get("position", -1),
+                    )
+                    new_id = self.notebook.cells[position].get("id")
+                    results.append(f"Cell with id {new_id} added at {position}.")
+                    continue
+
+                if op == "edit":
+                    try:
+                        cell = self.get_cell_by_id(cell_id)
+                    except ValueError:
+                        cell = None
+                    if cell is not None and id(cell) not in sources_before:
+                        sources_before[id(cell)] = (cell, cell.source)
+                    found = self.update_cell_source(cell_id, operation["source"])
+                elif op == "remove":
+                    found = self.remove_cell(cell_id)
+                elif op == "move":
+                    found = self.move_cell(cell_id, operation["position"])
+                else:
+                    raise ValueError(f"Operation {number}: unknown op {op!r}")
+
+                if not found:
+                    raise ValueError(f"Operation {number}: no cell with ID {cell_id}")
+                results.append(f"Cell with id {cell_id}: {op} done.")
+        except Exception as e:
+            self.notebook.cells[:] = cells_before
+            for cell, source in sources_before.values():
+                cell.source = source
+            self._rebuild_cell_index()
+
+            if isinstance(e, KeyError):
+                raise ValueError(f"Missing argument {e} in operation {number}")
+            raise
+
+        return results
+
+    @staticmethod
+    def _check_operation(number: int, operation: Any) -> None:
+        """Reject an operation whose arguments have the wrong type, before
+        any operation is applied
+
+        Raises:
+            ValueError: If the operation is not a dictionary or one of its
+                 arguments has the wrong type
+        """
+        if not isinstance(operation, dict):
+            raise ValueError(f"Operation {number} must be an object")
+        for key in ("op", "cell_id", "cell_type", "source"):
+            if key in operation and not isinstance(operation[key], str):
+                raise ValueError(f"Operation {number}: {key} must be a string")
+        position = operation.get("position", -1)
+        if not isinstance(position, int) or isinstance(position, bool):
+            raise ValueError(f"Operation {number}: position must be an integer")
+
     def execute_notebook(
-        self, parameters: Optional[Dict[str, Any]] = None
+        self,
+        parameters: Optional[Dict[str, Any]] = None,
+        timeout: int = DEFAULT_CELL_TIMEOUT,
+        deadline: Optional[float] = None,
     ) -> list[NotebookCell]:
         """Execute the notebook and return results
 
+        The kernel is interrupted if the current tool call is cancelled.
+
         Args:
             parameters: Optional dictionary of parameters to update in the notebook
+            timeout: Seconds a cell may run unless it sets its own limit, 0 for
+                 no limit
+            deadline: Optional time.monotonic() value by which every cell must
+                 have run
 
         Returns:
             Tuple containing:
                 - Dictionary mapping cell execution counts to their outputs
                 - Executed notebook node
         """
+        # Every cell may change, and they are not tracked one by one
+        self._changed_cell_ids = None
+
         # Update parameters if provided
         if parameters:
             for cell in self.notebook.cells:
-                if cell.cell_type == "code" and "parameters" in cell.metadata:
+                if cell.cell_type == "code" and (
+                    "parameters" in cell.metadata
+                    or "parameters" in cell.metadata.get("tags", [])
+                ):
                     cell.source = f"params = {parameters}"
 
-        # Execute the notebook
-        client = NotebookClient(self.notebook, timeout=600)
-        client.execute()
+        from nbclient import NotebookClient
+        from nbclient.util import run_sync
+
+        def time_limit(cell: NotebookNode) -> Optional[int]:
+            limit = cell_time_limit(cell, timeout, deadline)
+            # A cell reached past the deadline still gets a second to fail
+            return None if limit is None else max(limit, 1)
+
+        # Execute the notebook, from its own directory
+        client = NotebookClient(
+            self.notebook,
+            timeout=timeout or None,
+            timeout_func=time_limit,
+            resources={
+                "metadata": {
+                    "path": os.path.dirname(os.path.abspath(self.notebook_path))
+                }
+            },
+        )
+
+        def interrupt() -> None:
+            if client.km is not None:
+                run_sync(client.km.interrupt_kernel)()
+
+        cancellation = current_cancellation()
+        with cancellation.on_cancel(interrupt):
+            client.execute()
+        if stream_compactor.persist:
+            for cell in self.notebook.cells:
+                if cell.cell_type == "code":
+                    cell.outputs = stream_compactor.compact_outputs(cell.outputs)
         return self.get_notebook_details()
 
     def execute_cell_by_id(
-        self, cell_id: str, parameters: Optional[Dict[str, Any]] = None
+        self,
+        cell_id: str,
+        parameters: Optional[Dict[str, Any]] = None,
+        session: Optional[KernelSession] = None,
+        on_output: Optional[Callable[[Dict[str, Any]], None]] = None,
+        deadline: Optional[float] = None,
     ) -> list[NotebookCell]:
         """Execute a single cell in the notebook by its ID and return its results
 
         Args:
             cell_id: ID of the cell to execute
             parameters: Optional dictionary of parameters to update in the notebook
+            session: Optional kernel session to run the cell on. If not provided,
+                 a throwaway kernel is started for this execution only
+            on_output: Optional callback receiving each output message while the
+                 cell runs on the session kernel
+            deadline: Optional time.monotonic() value by which the cell must
+                 have run on the session kernel
 
         Returns:
             Output of the executed cell
+
+        Raises:
+            ExecutionInterrupted: If the cell was interrupted on the session
+                 kernel, with its outputs until then
         """
         # Find the cell with matching ID
-        target_cell = self.get_cell_by_id(cell_id)
-        cell_index = self.notebook.cells.index(target_cell)
+        cell_index = self.get_cell_position(cell_id)
+        target_cell = self.notebook.cells[cell_index]
 
         # Update parameters if provided and if it's a parameters cell
         if (
@@ -158,36 +446,282 @@ class NotebookManager:
         ):
             target_cell.source = f"params = {parameters}"
 
-        client = NotebookClient(self.notebook, timeout=600)
+        if session is not None:
+            self.executed_cell_ids.append(cell_id)
+            try:
+                executed_cell = session.execute_cell(
+                    self.notebook, target_cell, cell_index, on_output, deadline
+                )
+            except ExecutionInterrupted as e:
+                if e.cell is not None:
+                    e.executed = self.parse_notebook_nodes(e.cell)
+                raise
+            return self.parse_notebook_nodes(executed_cell)
+
+        from nbclient import NotebookClient
+
+        client = NotebookClient(self.notebook, timeout=DEFAULT_CELL_TIMEOUT)
         with client.setup_kernel():
             executed_cell = client.execute_cell(target_cell, cell_index)
             return self.parse_notebook_nodes(executed_cell)
 
+    def execute_cell_cached(
+        self,
+        cell_id: str,
+        session: KernelSession,
+        on_output: Optional[Callable[[Dict[str, Any]], None]] = None,
+        deadline: Optional[float] = None,
+    ) -> tuple[list[NotebookCell], bool]:
+        """Execute a cell on the session kernel, or reuse the outputs of an
+        identical earlier execution
+
+        An execution is reused if the same source ran on the same kernelspec
+        after the same cell sources had run. Cells tagged no-cache always run.
+
+        Args:
+            cell_id: ID of the cell to execute
+            session: Kernel session to run the cell on
+            on_output: Optional callback receiving each output message
+            deadline: Optional time.monotonic() value by which the cell must
+                 have run
+
+        Returns:
+            Tuple containing:
+                - Output of the executed cell
+                - Whether the outputs came from the execution cache
+        """
+        cell = self.get_cell_by_id(cell_id)
+        if not execution_cache.enabled or NO_CACHE_TAG in cell.metadata.get("tags", []):
+            return self.execute_cell_by_id(
+                cell_id, session=session, on_output=on_output, deadline=deadline
+            ), False
+
+        session.start(self.notebook)
+        key = execution_key(
+            session.kernel_name, cell.source, session.kernel_state(cell_id)
+        )
+        cached = execution_cache.get(key)
+        if cached is not None:
+            self.executed_cell_ids.append(cell_id)
+            cell.outputs = cached.outputs
+            cell.execution_count = cached.execution_count
+            return self.parse_notebook_nodes(cell), True
+
+        executed = self.execute_cell_by_id(
+            cell_id, session=session, on_output=on_output, deadline=deadline
+        )
+        execution_cache.put(key, cell.outputs, cell.execution_count)
+        return executed, False
+
+    def run_stale_cells(
+        self,
+        session: KernelSession,
+        force: bool = False,
+        on_output: Optional[Callable[[Dict[str, Any]], None]] = None,
+        deadline: Optional[float] = None,
+    ) -> tuple[list[NotebookCell], list[str]]:
+        """Execute the code cells that are stale on the session kernel, in order
+
+        A code cell is up to date if it ran on the current kernel with the same
+        source and the same sources in every code cell above it, which is
+        tracked with a chain hash recorded in the cell metadata. Once a cell is
+        executed, every code cell below it is executed too.
+
+        Args:
+            session: Kernel session to run the cells on
+            force: Execute every code cell, even if up to date
+            on_output: Optional callback receiving each output message
+            deadline: Optional time.monotonic() value by which every cell must
+                 have run
+
+        Returns:
+            Tuple containing:
+                - The executed cells
+                - IDs of the cells skipped as up to date
+
+        Raises:
+            CellExecutionError: If a cell fails, after recording the cells that ran
+            ExecutionInterrupted: If a cell was interrupted, with the outputs of
+                 the cells that ran
+        """
+        executed: list[NotebookCell] = []
+        skipped: list[str] = []
+        upstream_hash = ""
+        stale = force
+
+        for cell_index, cell in enumerate(list(self.notebook.cells)):
+            if cell.cell_type != "code":
+                continue
+
+            upstream_hash = chain_hash(upstream_hash, cell.source)
+            recorded = cell.metadata.get(METADATA_KEY, {}).get("chain_hash")
+            if (
+                not stale
+                and recorded == upstream_hash
+                and upstream_hash in session.executed_chains
+            ):
+                skipped.append(cell.get("id", ""))
+                continue
+
+            stale = True
+            self.executed_cell_ids.append(cell.get("id", ""))
+            try:
+                executed_cell = session.execute_cell(
+                    self.notebook, cell, cell_index, on_output, deadline
+                )
+            except ExecutionInterrupted as e:
+                e.executed = executed + (
+                    self.parse_notebook_nodes(e.cell) if e.cell is not None else []
+                )
+                raise
+            executed_cell.metadata[METADATA_KEY] = {"chain_hash": upstream_hash}
+            session.executed_chains.add(upstream_hash)
+            executed.extend(self.parse_notebook_nodes(executed_cell))
+
+        return executed, skipped
+
     def execute_cell_by_index(
-        self, cell_index: int, parameters: Optional[Dict[str, Any]] = None
+        self,
+        cell_index: int,
+        parameters: Optional[Dict[str, Any]] = None,
+        session: Optional[KernelSession] = None,
     ) -> list[NotebookCell]:
         """Execute a single cell in the notebook by its index and return its results
 
         Args:
             cell_index: Index of the cell to
             parameters: Optional dictionary of parameters to update in the notebook
+            session: Optional kernel session to run the cell on
 
         Returns:
             Output of the executed cell
         """
         target_cell = self.get_cell_by_index(cell_index)
-        return self.execute_cell_by_id(target_cell.get("id", ""), parameters)
+        return self.execute_cell_by_id(target_cell.get("id", ""), parameters, session)
 
     def save_notebook(self, path: Optional[str] = None) -> None:
         """Save the notebook to file
 
+        The file is replaced atomically. In write-behind mode the write may be
+        deferred and coalesced with later saves, see NotebookWriter.
+
         Args:
             path: Optional path to save the notebook to. If not provided,
                  uses the original path
         """
         save_path: str = path or self.notebook_path
-        with open(save_path, "w") as f:
-            nbformat.write(self.notebook, f)
+        notebook = self.notebook
+        is_own_path = os.path.realpath(save_path) == os.path.realpath(
+            self.notebook_path
+        )
+
+        def on_written(written: bool) -> None:
+            if written and is_own_path:
+                notebook_cache.refresh(save_path, notebook, version)
+            else:
+                notebook_cache.invalidate(save_path)
+
+        # Keep the entry valid until the write reaches the disk
+        if is_own_path:
+            previous = self.version
+            self.version = notebook_cache.store(save_path, notebook, self._cell_index)
+            notebook_history.record(
+                save_path,
+                previous,
+                self.version,
+                self._changed_cell_ids,
+                self._removed_cell_ids,
+            )
+            self._changed_cell_ids = set()
+            self._removed_cell_ids = set()
+        version = self.version
+
+        try:
+            with notebook_save_seconds.time():
+                notebook_writer.save(save_path, notebook, on_written)
+        except Exception:
+            self.discard_changes()
+            raise
+
+    def copy_for_execution(self) -> "NotebookManager":
+        """Copy the notebook so its cells can run without holding up readers
+        and writers of this one, see apply_executions
+
+        Only the top level of cells and metadata is copied: running a cell
+        replaces its outputs and sets metadata keys rather than changing them
+        in place.
+        """
+        executing = copy.copy(self)
+        executing.notebook = _shallow_copy(
+            self.notebook,
+            metadata=_shallow_copy(self.notebook.metadata),
+            cells=[
+                _shallow_copy(cell, metadata=_shallow_copy(cell.metadata))
+                for cell in self.notebook.cells
+            ],
+        )
+        executing._cell_index = dict(self._cell_index)
+        executing.executed_cell_ids = []
+        executing._changed_cell_ids = set()
+        executing._removed_cell_ids = set()
+        return executing
+
+    def apply_executions(self, executed: "NotebookManager") -> None:
+        """Take the outputs, execution counts and metadata of the cells run on
+        a copy of the notebook, matching cells by ID
+
+        Cells removed from the notebook since the copy was made are skipped.
+        """
+        for cell_id in dict.fromkeys(executed.executed_cell_ids):
+            try:
+                target = self.get_cell_by_id(cell_id)
+            except ValueError:
+                continue
+            source = executed.get_cell_by_id(cell_id)
+            if source.cell_type != "code" or target.cell_type != "code":
+                continue
+            outputs = source.outputs
+            if stream_compactor.persist:
+                outputs = stream_compactor.compact_outputs(outputs)
+            target.outputs = outputs
+            target.execution_count = source.execution_count
+            target.metadata = source.metadata
+            self._mark_changed(cell_id)
+
+    def discard_changes(self) -> None:
+        """Forget unsaved changes so the next load re-reads the notebook file"""
+        notebook_cache.invalidate(self.notebook_path)
+
+    def _mark_changed(self, cell_id: Optional[str]) -> None:
+        if cell_id is not None and self._changed_cell_ids is not None:
+            self._changed_cell_ids.add(cell_id)
+
+    def _build_cell_index(self) -> dict[str, int]:
+        cell_index: dict[str, int] = {}
+        for position, cell in enumerate(self.notebook.cells):
+            cell_id = cell.get("id")
+            # Keep the first cell when IDs are duplicated, like a linear scan
+            if cell_id is not None and cell_id not in cell_index:
+                cell_index[cell_id] = position
+        return cell_index
+
+    def _rebuild_cell_index(self) -> None:
+        # Update in place, the dict is shared with the notebook cache entry, and
+        # never drop a live ID, as concurrent readers may look it up meanwhile
+        cell_index = self._build_cell_index()
+        self._cell_index.update(cell_index)
+        for cell_id in self._cell_index.keys() - cell_index.keys():
+            self._cell_index.pop(cell_id, None)
+
+    def _reindex_cells_from(self, start: int) -> None:
+        """Refresh the positions of cells at or after start after an insert/remove"""
+        cells = self.notebook.cells
+        end = len(cells)
+        # Walk backwards so the first of any duplicated IDs wins
+        for position in range(end - 1, start - 1, -1):
+            cell_id = cells[position].get("id")
+            if cell_id is not None and self._cell_index.get(cell_id, end) >= start:
+                self._cell_index[cell_id] = position
 
     def parse_notebook_nodes(self, notebook: NotebookNode) -> list[NotebookCell]:
         """Parse a Jupyter notebook JSON string into a list of NotebookCell objects."""
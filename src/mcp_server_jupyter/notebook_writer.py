@@ -0,0 +1,161 @@
+import logging
+import os
+import tempfile
+import threading
+from typing import Callable, Optional
+
+import nbformat
+from nbformat import NotebookNode
+
+from mcp_server_jupyter.metrics import notebook_write_seconds
+from mcp_server_jupyter.notebook_locks import notebook_locks
+
+logger = logging.getLogger(__name__)
+
+
+def write_notebook_atomic(notebook: NotebookNode, path: str) -> None:
+    """Write a notebook to a temporary file next to path, then rename it over path
+
+    A crash mid-write leaves the previous version of the file untouched.
+    """
+    path = os.path.realpath(path)
+    directory, name = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f, notebook_write_seconds.time():
+            nbformat.write(notebook, f)
+            f.flush()
+            os.fsync(f.fileno())
+
+        # mkstemp creates the file as 0600, keep the mode of the file we replace
+        try:
+            mode = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            umask = os.umask(0)
+            os.umask(umask)
+            mode = 0o666 & ~umask
+        os.chmod(tmp_path, mode)
+
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+class NotebookWriter:
+    """Writes notebooks to disk, optionally coalescing bursts of saves.
+
+    With a delay of 0 every save is written immediately. Otherwise the first
+    save of a path schedules a write after the delay, and saves of the same
+    path made before it fires only replace the notebook that will be written.
+    """
+
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay: float = delay
+        self._pending: dict[
+            str,
+            tuple[NotebookNode, Optional[Callable[[bool], None]], threading.Timer],
+        ] = {}
+        # Set once the write of a save taken off _pending finished
+        self._writing: dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def save(
+        self,
+        path: str,
+        notebook: NotebookNode,
+        on_written: Optional[Callable[[bool], None]] = None,
+    ) -> None:
+        """Save a notebook now, or schedule it to be saved in write-behind mode
+
+        Errors of an immediate save are raised, errors of a scheduled save are
+        logged and reported through on_written.
+
+        Args:
+            path: Path to write the notebook to
+            notebook: The notebook to write
+            on_written: Optional callback run once the write finished, with
+                 True if the notebook reached the disk and False otherwise
+        """
+        path = os.path.realpath(path)
+        if self.delay <= 0:
+            self.flush(path)
+            write_notebook_atomic(notebook, path)
+            if on_written is not None:
+                on_written(True)
+            return
+
+        with self._lock:
+            pending = self._pending.get(path)
+            if pending is not None:
+                self._pending[path] = (notebook, on_written, pending[2])
+                return
+
+            timer = threading.Timer(self.delay, self._flush_pending, args=(path,))
+            timer.daemon = True
+            self._pending[path] = (notebook, on_written, timer)
+        timer.start()
+
+    def flush(self, path: str) -> None:
+        """Write the pending save of a path, if any, and wait for a write of it
+        already under way, before returning"""
+        self._flush_pending(os.path.realpath(path), raise_errors=True)
+
+    def flush_all(self) -> None:
+        """Write every pending save"""
+        with self._lock:
+            paths = list(self._pending)
+        for path in paths:
+            self._flush_pending(path)
+
+    def has_pending(self, path: str) -> bool:
+        """Whether a save of path is waiting to be written"""
+        return os.path.realpath(path) in self._pending
+
+    def _flush_pending(self, path: str, raise_errors: bool = False) -> None:
+        with self._lock:
+            if path not in self._pending and path not in self._writing:
+                return
+
+        # Tools change the notebook in place, hold them off while it is
+        # serialised. The lock is taken before the save is, so a thread that
+        # holds the notebook for writing never waits on a write it blocks.
+        with notebook_locks.read(path):
+            written = threading.Event()
+            with self._lock:
+                pending = self._pending.pop(path, None)
+                earlier = self._writing.get(path)
+                if pending is not None:
+                    self._writing[path] = written
+            # An earlier save must not be renamed over this one
+            if earlier is not None:
+                earlier.wait()
+            if pending is None:
+                return
+
+            notebook, on_written, timer = pending
+            timer.cancel()
+            try:
+                write_notebook_atomic(notebook, path)
+                error = None
+            except Exception as e:
+                error = e
+            finally:
+                with self._lock:
+                    if self._writing.get(path) is written:
+                        del self._writing[path]
+                written.set()
+            # Still under the lock, so the callback sees the file as written
+            if on_written is not None:
+                on_written(error is None)
+
+        if error is not None:
+            if raise_errors:
+                raise error
+            logger.error("Failed to write notebook %s", path, exc_info=error)
+
+
+notebook_writer = NotebookWriter()
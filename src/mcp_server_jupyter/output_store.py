@@ -0,0 +1,168 @@
+import hashlib
+import os
+import tempfile
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+import mcp.types as types
+from pydantic import AnyUrl
+
+OUTPUT_URI_PREFIX = "notebook-output://sha256/"
+
+
+def _default_directory() -> str:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, "mcp-server-jupyter", "outputs")
+
+
+class OutputStore:
+    """Content-addressed on-disk store of large cell outputs.
+
+    Outputs whose original payload is larger than the threshold are written
+    once under the SHA-256 of their MIME type and payload, and returned to
+    clients as a short embedded preview with a resource URI they can read in
+    full on demand. A threshold of 0 disables the store.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        threshold: int = 0,
+        preview_chars: int = 1000,
+    ) -> None:
+        self.directory: str = directory or _default_directory()
+        self.threshold: int = threshold
+        self.preview_chars: int = preview_chars
+
+    def offload(
+        self,
+        content: types.TextContent | types.ImageContent | types.EmbeddedResource,
+        payload: bytes,
+        mime_type: str,
+    ) -> types.TextContent | types.ImageContent | types.EmbeddedResource:
+        """Store an output whose original payload is above the threshold, and
+        return a reference to it in its place
+
+        Args:
+            content: Output to return to the client, rendered from the payload
+            payload: Original payload of the output, stored in full
+            mime_type: MIME type of the payload
+
+        Returns:
+            The output itself if its payload is small enough, or an embedded
+            preview pointing to the stored payload
+        """
+        if self.threshold <= 0 or len(payload) <= self.threshold:
+            return content
+        if not isinstance(content, (types.TextContent, types.ImageContent)):
+            return content
+
+        uri = self.put(payload, mime_type)
+        preview = ""
+        if isinstance(content, types.TextContent):
+            preview = f"{content.text[: self.preview_chars]}\n"
+        return types.EmbeddedResource(
+            type="resource",
+            resource=types.TextResourceContents(
+                uri=AnyUrl(uri),
+                mimeType="text/plain",
+                text=f"{preview}[... {content.type} output of {len(payload)} bytes "
+                f"of {mime_type}, read the resource {uri} to get all of it]",
+            ),
+        )
+
+    def put(self, payload: bytes, mime_type: str) -> str:
+        """Store a payload unless an identical one is already stored
+
+        Returns:
+            The resource URI of the payload
+        """
+        digest = hashlib.sha256(mime_type.encode() + b"\0" + payload).hexdigest()
+        path = self._path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._write(f"{path}.mime", mime_type.encode())
+            self._write(path, payload)
+        return f"{OUTPUT_URI_PREFIX}{digest}"
+
+    def read(self, uri: str) -> tuple[bytes, str]:
+        """Read a stored payload, or the byte range given by the offset and
+        length query parameters of the URI
+
+        Returns:
+            The payload and its MIME type
+
+        Raises:
+            ValueError: If the URI does not name a stored output or its offset
+                 or length is invalid
+        """
+        if not uri.startswith(OUTPUT_URI_PREFIX):
+            raise ValueError(f"Not an output resource: {uri}")
+
+        parsed = urlparse(uri)
+        digest = parsed.path.lstrip("/")
+        if len(digest) != 64 or not all(c in "0123456789abcdef" for c in digest):
+            raise ValueError(f"Invalid output resource: {uri}")
+
+        query = parse_qs(parsed.query)
+        try:
+            offset = int(query.get("offset", ["0"])[0])
+            length = int(query["length"][0]) if "length" in query else -1
+        except ValueError:
+            raise ValueError(f"Offset and length must be integers: {uri}")
+        if offset < 0:
+            raise ValueError(f"Offset must not be negative: {uri}")
+        if length < 0 and "length" in query:
+            raise ValueError(f"Length must not be negative: {uri}")
+
+        path = self._path(digest)
+        try:
+            with open(f"{path}.mime", "rb") as f:
+                mime_type = f.read().decode()
+            with open(path, "rb") as f:
+                f.seek(offset)
+                return f.read(length), mime_type
+        except FileNotFoundError:
+            raise ValueError(f"No stored output for {uri}")
+
+    def list_uris(self, limit: int = 100) -> list[tuple[str, str, int]]:
+        """List the most recently stored outputs
+
+        Returns:
+            (URI, MIME type, size) of each output, newest first
+        """
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+
+        for prefix in os.scandir(self.directory):
+            if not prefix.is_dir():
+                continue
+            for entry in os.scandir(prefix.path):
+                if entry.name.endswith(".mime") or entry.name.startswith("."):
+                    continue
+                entries.append((entry.stat().st_mtime, entry.name, entry.path))
+
+        results = []
+        for _, digest, path in sorted(entries, reverse=True)[:limit]:
+            with open(f"{path}.mime", "rb") as f:
+                mime_type = f.read().decode()
+            results.append(
+                (f"{OUTPUT_URI_PREFIX}{digest}", mime_type, os.path.getsize(path))
+            )
+        return results
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def _write(self, path: str, data: bytes) -> None:
+        # Write through a temporary file so readers never see a partial payload
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+
+output_store = OutputStore()
@@ -1,58 +1,102 @@
+import asyncio
+import itertools
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
 import mcp.server.stdio
 import mcp.types as types
 from mcp.server.lowlevel import NotificationOptions, Server
 from mcp.server.models import InitializationOptions
-from mcp.server.sse import SseServerTransport
-from starlette.applications import Starlette
-from starlette.middleware import Middleware
-from starlette.middleware.cors import CORSMiddleware
-from starlette.routing import Mount, Route
+from pydantic import AnyUrl
 
+from mcp_server_jupyter.cancellation import (
+    cancellable_requests,
+    current_cancellation,
+    tracking_call,
+)
+from mcp_server_jupyter.dispatch import dispatcher
+from mcp_server_jupyter.execution_cache import execution_cache
+from mcp_server_jupyter.image_processing import IMAGE_FORMATS, image_reducer
+from mcp_server_jupyter.kernel_session import (
+    DEFAULT_CELL_TIMEOUT,
+    ExecutionInterrupted,
+    KernelSession,
+    kernel_sessions,
+)
+from mcp_server_jupyter.lazy_notebook import LazyNotebook, UnsupportedNotebook
+from mcp_server_jupyter.metrics import (
+    metrics,
+    notebook_scan_seconds,
+    record_tool_call,
+    trace_log,
+)
+from mcp_server_jupyter.mime_renderers import mime_renderers
+from mcp_server_jupyter.notebook_cache import notebook_cache
+from mcp_server_jupyter.notebook_cell import CellOutput, NotebookCell
+from mcp_server_jupyter.notebook_history import NotebookChanges, notebook_history
+from mcp_server_jupyter.notebook_locks import notebook_locks
 from mcp_server_jupyter.notebook_manager import NotebookManager
+from mcp_server_jupyter.notebook_writer import notebook_writer
+from mcp_server_jupyter.output_store import output_store
+from mcp_server_jupyter.stream_output import stream_compactor
+from mcp_server_jupyter.variable_inspection import (
+    DEFAULT_REPR_CHARS,
+    inspect_variables,
+)
 
 # Initialize server instance for Jupyter notebook management
 server = Server("mcp-server-jupyter")
-sse = SseServerTransport("/messages/")
-
-
-# Set up Starlette routes for SSE transport
-async def handle_sse(request):
-    async with sse.connect_sse(
-        request.scope, request.receive, request._send
-    ) as streams:  # noqa: SLF001
-        await server.run(
-            streams[0],
-            streams[1],
-            InitializationOptions(
-                server_name="Jupyter notebook manager",
-                server_version="0.1.0",
-                capabilities=server.get_capabilities(
-                    notification_options=NotificationOptions(),
-                    experimental_capabilities={},
-                ),
-            ),
-        )
 
 
-# Configure CORS middleware
-middleware = [
-    Middleware(
-        CORSMiddleware,
-        allow_origins=["*"],
-        allow_methods=["GET", "POST"],
-        allow_headers=["Accept", "Content-Type", "Origin"],
-        expose_headers=["Content-Type", "Content-Length"],
-        allow_credentials=False,
-    )
-]
-
-starlette_app = Starlette(
-    routes=[
-        Route("/sse", endpoint=handle_sse),
-        Mount("/messages/", app=sse.handle_post_message),
-    ],
-    middleware=middleware,
-)
+def __getattr__(name: str) -> Any:
+    # The SSE app and its dependencies are only loaded when something uses them,
+    # so that stdio sessions start faster
+    if name in ("sse", "starlette_app", "handle_sse", "handle_metrics", "middleware"):
+        from mcp_server_jupyter import sse_app
+
+        return getattr(sse_app, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Resource serving the server metrics to stdio clients, which cannot scrape /metrics
+METRICS_URI = "metrics://prometheus"
+
+
+@server.list_resources()
+async def handle_list_resources() -> list[types.Resource]:
+    return [
+        types.Resource(
+            uri=AnyUrl(METRICS_URI),
+            name="Server metrics",
+            description="Tool call, notebook and kernel metrics in the "
+            "Prometheus text format",
+            mimeType="text/plain",
+        ),
+        *(
+            types.Resource(
+                uri=AnyUrl(uri),
+                name=f"Cell output {uri.rsplit('/', 1)[-1][:12]}",
+                description=f"{size} bytes",
+                mimeType=mime_type,
+            )
+            for uri, mime_type, size in await dispatcher.run_io(output_store.list_uris)
+        ),
+    ]
+
+
+@server.read_resource()
+async def handle_read_resource(uri: AnyUrl) -> str | bytes:
+    """Read a stored cell output, optionally a byte range of it given by the
+    offset and length query parameters, or the server metrics"""
+    if str(uri) == METRICS_URI:
+        return metrics.render()
+
+    payload, mime_type = await dispatcher.run_io(output_store.read, str(uri))
+    if mime_type.startswith("text/"):
+        return payload.decode(errors="replace")
+    return payload
 
 
 @server.list_tools()
@@ -65,12 +109,56 @@ async def handle_list_tools() -> list[types.Tool]:
                 "including cell outputs. "
                 "Use this before modifying a notebook to understand "
                 "its existing content and determine "
-                "if changes are needed."
+                "if changes are needed. "
+                "Large notebooks can be read page by page with offset/limit "
+                "or a cell ID range, max_bytes and the returned cursor. "
+                "Starts with the notebook version, to pass as expected_version "
+                "to changes, or as since to a later read to get only what changed."
             ),
             inputSchema={
                 "type": "object",
                 "properties": {
                     "notebook_path": {"type": "string"},
+                    "offset": {
+                        "type": "integer",
+                        "minimum": 0,
+                        "description": "Index of the first cell to return",
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "Maximum number of cells to return",
+                    },
+                    "start_cell_id": {
+                        "type": "string",
+                        "description": "ID of the first cell to return",
+                    },
+                    "end_cell_id": {
+                        "type": "string",
+                        "description": "ID of the last cell to return",
+                    },
+                    "max_bytes": {
+                        "type": "integer",
+                        "description": (
+                            "Approximate size budget of the response. Cells that "
+                            "do not fit are left for the next page."
+                        ),
+                    },
+                    "cursor": {
+                        "type": "string",
+                        "description": (
+                            "Continuation cursor returned by a previous paginated read"
+                        ),
+                    },
+                    "since": {
+                        "type": "string",
+                        "description": (
+                            "Notebook version of an earlier read. Only the cells "
+                            "added or changed since are returned, with their "
+                            "positions, along with the IDs of removed cells. "
+                            "The whole notebook is returned if the version is no "
+                            "longer known."
+                        ),
+                    },
                 },
                 "required": ["notebook_path"],
             },
@@ -83,12 +171,55 @@ async def handle_list_tools() -> list[types.Tool]:
                 "Use this when size limitations prevent "
                 "reading the full notebook with outputs. "
                 "Individual cell outputs can be retrieved "
-                "using the read_output_of_cell tool."
+                "using the read_output_of_cell tool. "
+                "Supports the same pagination arguments as "
+                "read_notebook_with_outputs, and also starts with the notebook "
+                "version."
             ),
             inputSchema={
                 "type": "object",
                 "properties": {
                     "notebook_path": {"type": "string"},
+                    "offset": {
+                        "type": "integer",
+                        "minimum": 0,
+                        "description": "Index of the first cell to return",
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "Maximum number of cells to return",
+                    },
+                    "start_cell_id": {
+                        "type": "string",
+                        "description": "ID of the first cell to return",
+                    },
+                    "end_cell_id": {
+                        "type": "string",
+                        "description": "ID of the last cell to return",
+                    },
+                    "max_bytes": {
+                        "type": "integer",
+                        "description": (
+                            "Approximate size budget of the response. Cells that "
+                            "do not fit are left for the next page."
+                        ),
+                    },
+                    "cursor": {
+                        "type": "string",
+                        "description": (
+                            "Continuation cursor returned by a previous paginated read"
+                        ),
+                    },
+                    "since": {
+                        "type": "string",
+                        "description": (
+                            "Notebook version of an earlier read. Only the cells "
+                            "added or changed since are returned, with their "
+                            "positions, along with the IDs of removed cells. "
+                            "The whole notebook is returned if the version is no "
+                            "longer known."
+                        ),
+                    },
                 },
                 "required": ["notebook_path"],
             },
@@ -110,17 +241,70 @@ async def handle_list_tools() -> list[types.Tool]:
             description=(
                 "Executes a specific cell in a notebook and returns its output. "
                 "Useful to check that the cell runs without errors "
-                "as well as produces the desired output."
+                "as well as produces the desired output. "
+                "Cells of the same notebook share a kernel that is kept alive "
+                "between calls, so variables and imports persist. "
+                "Outputs are also streamed as log notifications while the cell runs. "
+                "A cell that runs out of time or whose call is cancelled is "
+                "interrupted, keeping its kernel, and its outputs so far are returned."
             ),
             inputSchema={
                 "type": "object",
                 "properties": {
                     "notebook_path": {"type": "string"},
                     "cell_id": {"type": "string"},
+                    "use_cache": {
+                        "type": "boolean",
+                        "description": (
+                            "Return the outputs of an earlier identical execution "
+                            "instead of running the cell again: same source, "
+                            "same kernel, same cells run before it. "
+                            "Only use for deterministic cells."
+                        ),
+                    },
+                    "timeout": {
+                        "type": "number",
+                        "description": (
+                            "Seconds the call may take. A cell still running "
+                            "then is interrupted and its outputs so far are "
+                            "returned. Cells are also limited by their 'timeout' "
+                            "metadata, in seconds, or else the server default."
+                        ),
+                    },
                 },
                 "required": ["notebook_path", "cell_id"],
             },
         ),
+        types.Tool(
+            name="run_notebook",
+            description=(
+                "Run the code cells of a notebook that are out of date on its "
+                "kernel: cells whose source, or the source of a code cell above "
+                "them, changed since they last ran, and every cell below those. "
+                "Up-to-date cells are skipped. Returns the outputs of the "
+                "executed cells."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "notebook_path": {"type": "string"},
+                    "force": {
+                        "type": "boolean",
+                        "description": "Run every code cell, even if up to date",
+                    },
+                    "timeout": {
+                        "type": "number",
+                        "description": (
+                            "Seconds the call may take. A cell still running "
+                            "then is interrupted and its outputs so far are "
+                            "returned. Cells are also limited by their 'timeout' "
+                            "metadata, in seconds, or else the server default."
+                        ),
+                    },
+                },
+                "required": ["notebook_path"],
+            },
+        ),
         types.Tool(
             name="add_cell",
             description="Add a new cell to the notebook at the specified position.",
@@ -131,6 +315,14 @@ async def handle_list_tools() -> list[types.Tool]:
                     "cell_type": {"type": "string"},
                     "source": {"type": "string"},
                     "position": {"type": "integer"},
+                    "expected_version": {
+                        "type": "string",
+                        "description": (
+                            "Notebook version returned by an earlier read or "
+                            "change. The change is rejected if the notebook "
+                            "changed since."
+                        ),
+                    },
                 },
                 "required": ["notebook_path", "source"],
             },
@@ -150,41 +342,296 @@ async def handle_list_tools() -> list[types.Tool]:
                         ),
                     },
                     "source": {"type": "string"},
+                    "expected_version": {
+                        "type": "string",
+                        "description": (
+                            "Notebook version returned by an earlier read or "
+                            "change. The change is rejected if the notebook "
+                            "changed since."
+                        ),
+                    },
                 },
                 "required": ["notebook_path", "cell_id", "source"],
             },
         ),
+        types.Tool(
+            name="run_notebooks",
+            description=(
+                "Execute several notebooks from top to bottom in parallel, "
+                "each on a fresh kernel, and save each executed copy to its "
+                "output_path. Parameters replace the source of the cells tagged "
+                "'parameters' with 'params = {...}'. Returns the status of "
+                "each job."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "jobs": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "notebook_path": {"type": "string"},
+                                "parameters": {"type": "object"},
+                                "output_path": {"type": "string"},
+                            },
+                            "required": ["notebook_path", "output_path"],
+                        },
+                    },
+                    "timeout": {
+                        "type": "number",
+                        "description": (
+                            "Seconds the whole batch may take, after which the "
+                            "running cells fail. Cells are also limited by their "
+                            "'timeout' metadata, in seconds, or else the server "
+                            "default."
+                        ),
+                    },
+                },
+                "required": ["jobs"],
+            },
+        ),
+        types.Tool(
+            name="batch_edit",
+            description=(
+                "Apply several cell operations to the notebook at once. "
+                "Operations are applied in order and either all succeed or "
+                "none is applied. Prefer this over many add_cell/edit_cell calls "
+                "when restructuring a notebook."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "notebook_path": {"type": "string"},
+                    "operations": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "op": {
+                                    "type": "string",
+                                    "enum": ["add", "edit", "remove", "move"],
+                                },
+                                "cell_id": {
+                                    "type": "string",
+                                    "description": "Target cell for edit, remove "
+                                    "and move",
+                                },
+                                "cell_type": {
+                                    "type": "string",
+                                    "description": "Type of the new cell for add",
+                                },
+                                "source": {
+                                    "type": "string",
+                                    "description": "Cell content for add and edit",
+                                },
+                                "position": {
+                                    "type": "integer",
+                                    "description": "Target index for add and move "
+                                    "(-1 to append)",
+                                },
+                            },
+                            "required": ["op"],
+                        },
+                    },
+                    "expected_version": {
+                        "type": "string",
+                        "description": (
+                            "Notebook version returned by an earlier read or "
+                            "change. The change is rejected if the notebook "
+                            "changed since."
+                        ),
+                    },
+                },
+                "required": ["notebook_path", "operations"],
+            },
+        ),
+        types.Tool(
+            name="inspect_variables",
+            description=(
+                "Summarize variables of the running kernel of the Python notebook "
+                "at notebook_path: type, approximate size in memory, shape and "
+                "dtypes of arrays and data frames, length, and a truncated repr. "
+                "Use this instead of adding a cell that prints a variable. "
+                "Nothing is printed or saved to the notebook."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "notebook_path": {"type": "string"},
+                    "names": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": (
+                            "Variables to inspect, by default every variable "
+                            "other than modules, functions and classes"
+                        ),
+                    },
+                    "max_repr_chars": {
+                        "type": "integer",
+                        "description": (
+                            "Characters of each variable's repr "
+                            f"(default: {DEFAULT_REPR_CHARS})"
+                        ),
+                    },
+                },
+                "required": ["notebook_path"],
+            },
+        ),
+        types.Tool(
+            name="restart_kernel",
+            description=(
+                "Restart the kernel of the notebook at notebook_path, "
+                "clearing all variables and imports."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "notebook_path": {"type": "string"},
+                },
+                "required": ["notebook_path"],
+            },
+        ),
+        types.Tool(
+            name="shutdown_kernel",
+            description="Shut down the kernel of the notebook at notebook_path.",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "notebook_path": {"type": "string"},
+                },
+                "required": ["notebook_path"],
+            },
+        ),
     ]
 
 
 @server.call_tool()
 async def handle_call_tool(name: str, arguments: dict):
-    """Route tool calls to their respective handlers"""
-    if name == "read_notebook_with_outputs":
-        return _read_notebook(arguments["notebook_path"])
-    elif name == "read_notebook_source_only":
-        return _read_notebook(arguments["notebook_path"], with_outputs=False)
+    """Route tool calls to their respective handlers, recording their metrics"""
+    try:
+        request_id = server.request_context.request_id
+    except LookupError:
+        request_id = None
+    with (
+        record_tool_call(name, arguments.get("notebook_path")) as call,
+        tracking_call(request_id),
+    ):
+        results = await _call_tool(name, arguments)
+        call.response_bytes = sum(_content_size(content) for content in results)
+        return results
+
+
+async def _call_tool(
+    name: str, arguments: dict
+) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
+    if name in ("read_notebook_with_outputs", "read_notebook_source_only"):
+        return await dispatcher.run_io(
+            _read_notebook,
+            arguments["notebook_path"],
+            name == "read_notebook_with_outputs",
+            ReadPage(
+                offset=arguments.get("offset", 0),
+                limit=arguments.get("limit"),
+                start_cell_id=arguments.get("start_cell_id"),
+                end_cell_id=arguments.get("end_cell_id"),
+                max_bytes=arguments.get("max_bytes"),
+                cursor=arguments.get("cursor"),
+                since=arguments.get("since"),
+            ),
+        )
     elif name == "read_output_of_cell":
-        return _read_cell_output(arguments["notebook_path"], arguments["cell_id"])
+        return await dispatcher.run_io(
+            _read_cell_output, arguments["notebook_path"], arguments["cell_id"]
+        )
     elif name == "execute_cell":
-        return _execute_cell(arguments["notebook_path"], arguments["cell_id"])
+        return await dispatcher.run_execution(
+            kernel_sessions.get(arguments["notebook_path"]),
+            _execute_cell,
+            arguments["notebook_path"],
+            arguments["cell_id"],
+            _output_notifier("execute_cell"),
+            arguments.get("use_cache", False),
+            _deadline(arguments),
+        )
+    elif name == "run_notebook":
+        return await dispatcher.run_execution(
+            kernel_sessions.get(arguments["notebook_path"]),
+            _run_notebook,
+            arguments["notebook_path"],
+            arguments.get("force", False),
+            _output_notifier("run_notebook"),
+            _deadline(arguments),
+        )
+    elif name == "run_notebooks":
+        jobs = arguments["jobs"]
+        deadline = _deadline(arguments)
+        statuses = await dispatcher.run_notebook_jobs(
+            _run_notebook_job,
+            [
+                (
+                    job["notebook_path"],
+                    job.get("parameters"),
+                    job["output_path"],
+                    deadline,
+                )
+                for job in jobs
+            ],
+        )
+        return [
+            types.TextContent(
+                type="text",
+                text="\n".join(
+                    f"Job {number} ({job['notebook_path']}): {status}"
+                    for number, (job, status) in enumerate(zip(jobs, statuses), 1)
+                ),
+            )
+        ]
     elif name == "add_cell":
-        return _add_cell(
+        return await dispatcher.run_io(
+            _add_cell,
             arguments["notebook_path"],
             arguments.get("cell_type", "code"),
             arguments["source"],
             arguments.get("position", -1),
+            arguments.get("expected_version"),
         )
     elif name == "edit_cell":
-        return _edit_cell(
-            arguments["notebook_path"], arguments["cell_id"], arguments["source"]
+        return await dispatcher.run_io(
+            _edit_cell,
+            arguments["notebook_path"],
+            arguments["cell_id"],
+            arguments["source"],
+            arguments.get("expected_version"),
         )
+    elif name == "batch_edit":
+        return await dispatcher.run_io(
+            _batch_edit,
+            arguments["notebook_path"],
+            arguments["operations"],
+            arguments.get("expected_version"),
+        )
+    elif name == "inspect_variables":
+        return await dispatcher.run_io(
+            _inspect_variables,
+            arguments["notebook_path"],
+            arguments.get("names"),
+            arguments.get("max_repr_chars", DEFAULT_REPR_CHARS),
+        )
+    elif name == "restart_kernel":
+        return await dispatcher.run_io(_restart_kernel, arguments["notebook_path"])
+    elif name == "shutdown_kernel":
+        return await dispatcher.run_io(_shutdown_kernel, arguments["notebook_path"])
 
     raise ValueError(f"Unknown tool: {name}")
 
 
 def _add_cell(
-    notebook_path: str, cell_type: str, source: str, position: int
+    notebook_path: str,
+    cell_type: str,
+    source: str,
+    position: int,
+    expected_version: Optional[str] = None,
 ) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
     """Add a new cell to the notebook with the souce specified.
 
@@ -193,23 +640,31 @@ def _add_cell(
         cell_type: Type of cell to add ('code' or 'markdown')
         source: Cell content
         position: Index where to insert the cell (-1 for append)
+        expected_version: Optional version the notebook must still be at
 
     Returns:
-        A new cell id if successful, or an error message if not
+        A new cell id and the new notebook version if successful, or an error
+        message if not
     """
     try:
-        nb_manager = NotebookManager(notebook_path)
-        new_cell_index = nb_manager.add_cell(
-            cell_type=cell_type,
-            source=source,
-            position=position,
-        )
-        nb_manager.save_notebook()
-        id = nb_manager.get_cell_by_index(new_cell_index).get("id")
+        with notebook_locks.write(notebook_path):
+            nb_manager = NotebookManager(notebook_path)
+            conflict = _version_conflict(nb_manager, expected_version)
+            if conflict:
+                return conflict
+            new_cell_index = nb_manager.add_cell(
+                cell_type=cell_type,
+                source=source,
+                position=position,
+            )
+            nb_manager.save_notebook()
+            # Read under the lock, other calls can move cells of the cached node
+            id = nb_manager.get_cell_by_index(new_cell_index).get("id")
         return [
             types.TextContent(
                 type="text", text=f"Cell with id {id} added successfully."
             ),
+            _version_content(nb_manager.version),
         ]
     except Exception as e:
         return [
@@ -224,6 +679,7 @@ def _edit_cell(
     notebook_path: str,
     id: str,
     source: str,
+    expected_version: Optional[str] = None,
 ) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
     """Edit an existing cell.
 
@@ -231,52 +687,284 @@ def _edit_cell(
         notebook_path: Path to the target notebook
         id: Unique identifier of the cell to edit
         source: New cell content
+        expected_version: Optional version the notebook must still be at
 
     Returns:
-        Cell id if successful, or an error message if not
+        Cell id and the new notebook version if successful, or an error
+        message if not
     """
-    nb_manager = NotebookManager(notebook_path)
-    if not nb_manager.update_cell_source(id=id, new_source=source):
-        return [
-            types.TextContent(
-                type="text",
-                text="No cell with the specified ID exists in the notebook.",
-            )
-        ]
+    with notebook_locks.write(notebook_path):
+        nb_manager = NotebookManager(notebook_path)
+        conflict = _version_conflict(nb_manager, expected_version)
+        if conflict:
+            return conflict
+        if not nb_manager.update_cell_source(id=id, new_source=source):
+            return [
+                types.TextContent(
+                    type="text",
+                    text="No cell with the specified ID exists in the notebook.",
+                )
+            ]
 
-    nb_manager.save_notebook()
+        nb_manager.save_notebook()
 
     return [
         types.TextContent(type="text", text=f"Cell with id {id} updated successfully."),
+        _version_content(nb_manager.version),
+    ]
+
+
+def _batch_edit(
+    notebook_path: str,
+    operations: list[dict],
+    expected_version: Optional[str] = None,
+) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
+    """Apply several cell operations with a single load and save.
+
+    Args:
+        notebook_path: Path to the target notebook
+        operations: Ordered add/edit/remove/move operations
+        expected_version: Optional version the notebook must still be at
+
+    Returns:
+        The result of each operation and the new notebook version, or an error
+        message if none was applied
+    """
+    with notebook_locks.write(notebook_path):
+        nb_manager = NotebookManager(notebook_path)
+        conflict = _version_conflict(nb_manager, expected_version)
+        if conflict:
+            return conflict
+        try:
+            results = nb_manager.apply_operations(operations)
+        except ValueError as e:
+            return [
+                types.TextContent(
+                    type="text",
+                    text=f"No changes were applied to the notebook: {str(e)}",
+                )
+            ]
+
+        nb_manager.save_notebook()
+
+    return [
+        types.TextContent(type="text", text="\n".join(results)),
+        _version_content(nb_manager.version),
+    ]
+
+
+def _version_conflict(
+    nb_manager: NotebookManager, expected_version: Optional[str]
+) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
+    """Reject a change to a notebook that changed since the client read it
+
+    Returns:
+        An error message if the notebook is not at the expected version, or
+        nothing if it is or no version was expected
+    """
+    if expected_version is None or expected_version == nb_manager.version:
+        return []
+    return [
+        types.TextContent(
+            type="text",
+            text=f"The notebook changed since version {expected_version} was "
+            f"read, it is now at version {nb_manager.version}. No changes were "
+            "applied; read the notebook again before retrying.",
+        )
     ]
 
 
+def _version_content(version: str) -> types.TextContent:
+    return types.TextContent(type="text", text=f"Notebook version: {version}")
+
+
+@dataclass
+class ReadPage:
+    """Which cells of a notebook a read returns"""
+
+    offset: int = 0
+    limit: Optional[int] = None
+    start_cell_id: Optional[str] = None
+    end_cell_id: Optional[str] = None
+    max_bytes: Optional[int] = None
+    cursor: Optional[str] = None
+    # Version of an earlier read, to return only the cells changed since
+    since: Optional[str] = None
+
+
+def _content_size(
+    content: types.TextContent | types.ImageContent | types.EmbeddedResource,
+) -> int:
+    if isinstance(content, types.TextContent):
+        # ASCII text is as long in UTF-8, without encoding a copy of it
+        text = content.text
+        return len(text) if text.isascii() else len(text.encode())
+    if isinstance(content, types.ImageContent):
+        return len(content.data)
+    return len(content.model_dump_json())
+
+
+def _truncate_content(
+    content: types.TextContent | types.ImageContent | types.EmbeddedResource,
+    budget: int,
+) -> types.TextContent | types.ImageContent | types.EmbeddedResource:
+    """Shrink an output to fit within budget bytes, leaving a truncation marker"""
+    size = _content_size(content)
+    if size <= budget:
+        return content
+
+    if isinstance(content, types.TextContent):
+        text = content.text.encode()[: max(budget, 0)].decode(errors="ignore")
+        return types.TextContent(
+            type="text",
+            text=f"{text}\n[... output truncated, {size - len(text.encode())} "
+            "more bytes]",
+        )
+    return types.TextContent(
+        type="text",
+        text=f"[{getattr(content, 'mimeType', content.type)} output omitted, "
+        f"{size} bytes]",
+    )
+
+
+def _open_for_read(
+    notebook_path: str, with_outputs: bool
+) -> NotebookManager | LazyNotebook:
+    """Open a notebook to read a range of its cells
+
+    Notebooks already in the notebook cache are read from there. Otherwise a
+    source-only read scans the file lazily, so outputs are never decoded,
+    unless the notebook is in a format only a full parse understands. The
+    caller must close a LazyNotebook once done with it.
+
+    Args:
+        notebook_path: Path to the notebook
+        with_outputs: Whether the outputs of the cells will be read
+    """
+    if with_outputs or notebook_cache.is_cached(notebook_path):
+        return NotebookManager(notebook_path)
+
+    notebook_writer.flush(notebook_path)
+    try:
+        with notebook_scan_seconds.time():
+            nb_manager = LazyNotebook(notebook_path)
+            try:
+                # Scan the cell IDs up front, before anything of the notebook is used
+                nb_manager.cell_count
+            except UnsupportedNotebook:
+                nb_manager.close()
+                raise
+        return nb_manager
+    except UnsupportedNotebook:
+        return NotebookManager(notebook_path)
+
+
 def _read_notebook(
     notebook_path: str,
     with_outputs: bool = True,
+    page: Optional[ReadPage] = None,
 ) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
     """Read contents of a notebook with optional outputs.
 
     Args:
         notebook_path: Path to the notebook
         with_outputs: Include execution outputs if True
+        page: Optional range of cells and size budget to read
 
     Returns:
-        List of cell contents and outputs
+        The notebook version, then the cell contents and outputs, followed by
+        a continuation cursor if the page did not reach the end of the notebook
     """
-    nb_manager = NotebookManager(notebook_path)
+    page = page or ReadPage()
+    if page.offset < 0:
+        raise ValueError(f"Offset must not be negative: {page.offset}")
+
+    with notebook_locks.read(notebook_path):
+        nb_manager = _open_for_read(notebook_path, with_outputs)
+        try:
+            return _read_notebook_page(notebook_path, nb_manager, with_outputs, page)
+        finally:
+            if isinstance(nb_manager, LazyNotebook):
+                nb_manager.close()
+
+
+def _read_notebook_page(
+    notebook_path: str,
+    nb_manager: NotebookManager | LazyNotebook,
+    with_outputs: bool,
+    page: ReadPage,
+) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
+    cell_count = nb_manager.cell_count
+
+    start = page.offset
+    if page.cursor is not None:
+        start = nb_manager.get_cell_position(page.cursor)
+    elif page.start_cell_id is not None:
+        start = nb_manager.get_cell_position(page.start_cell_id)
+    stop = cell_count
+    if page.end_cell_id is not None:
+        stop = nb_manager.get_cell_position(page.end_cell_id) + 1
+
+    notices = []
+    changes = None
+    if page.since is not None:
+        changes = notebook_history.changes_since(
+            notebook_path, page.since, nb_manager.version
+        )
+        if changes is None:
+            notices.append(
+                types.TextContent(
+                    type="text",
+                    text=f"Version {page.since} is no longer known, returning the "
+                    "notebook in full.",
+                )
+            )
+
+    changed_positions: list[int] = []
+    if changes is None:
+        if page.limit is not None:
+            stop = min(stop, start + page.limit)
+        start = max(0, min(start, stop))
+        positions = range(start, stop)
+    else:
+        assert page.since is not None
+        changed_positions = _changed_positions(nb_manager, changes.changed, start, stop)
+        if page.cursor is None:
+            notices.append(
+                _changes_content(page.since, len(changed_positions), changes)
+            )
+        positions = changed_positions[: page.limit]
+
     results = []
+    used_bytes = 0
+    returned = 0
 
-    for nb in nb_manager.get_notebook_details():
-        results.extend(
-            [
-                types.TextContent(type="text", text=f"Cell with ID: {nb.cell_id}"),
-                types.TextContent(type="text", text=nb.content),
-            ]
+    if changes is None:
+        cells = zip(
+            positions, nb_manager.iter_notebook_details(start, stop, with_outputs)
         )
+    else:
+        cells = (
+            (position, cell)
+            for position in positions
+            for cell in nb_manager.iter_notebook_details(
+                position, position + 1, with_outputs
+            )
+        )
+
+    for position, nb in cells:
+        header = f"Cell with ID: {nb.cell_id}"
+        if changes is not None:
+            header += f" at position {position}"
+        cell_results: list[
+            types.TextContent | types.ImageContent | types.EmbeddedResource
+        ] = [
+            types.TextContent(type="text", text=header),
+            types.TextContent(type="text", text=nb.content),
+        ]
 
         if with_outputs and nb.cell_type == "code":
-            results.extend(
+            cell_results.extend(
                 [
                     types.TextContent(
                         type="text", text=f"Output of cell {nb.cell_id}:"
@@ -285,7 +973,85 @@ def _read_notebook(
                 ]
             )
 
-    return results
+        if page.max_bytes is not None:
+            cell_bytes = sum(_content_size(content) for content in cell_results)
+            if used_bytes + cell_bytes > page.max_bytes:
+                if results:
+                    break
+                # Always return at least one cell, shrinking its outputs to fit
+                remaining = page.max_bytes - sum(
+                    _content_size(content) for content in cell_results[:3]
+                )
+                truncated = []
+                for content in cell_results[3:]:
+                    content = _truncate_content(content, remaining)
+                    remaining -= _content_size(content)
+                    truncated.append(content)
+                cell_results[3:] = truncated
+                cell_bytes = sum(_content_size(content) for content in cell_results)
+            used_bytes += cell_bytes
+
+        results.extend(cell_results)
+        returned += 1
+
+    if changes is not None:
+        more = changed_positions[returned:]
+        if more:
+            next_cell_id = nb_manager.get_cell_by_index(more[0]).get("id")
+            results.append(
+                types.TextContent(
+                    type="text",
+                    text=f"Returned {returned} changed cells, {len(more)} "
+                    f"more remain. Continue with cursor={next_cell_id} and the "
+                    "same since",
+                )
+            )
+        return [_version_content(nb_manager.version), *notices, *results]
+
+    # A page cut short by limit or max_bytes can be continued, up to end_cell_id
+    next_position = start + returned
+    end = stop if page.end_cell_id is not None else cell_count
+    if next_position < end:
+        next_cell_id = nb_manager.get_cell_by_index(next_position).get("id")
+        results.append(
+            types.TextContent(
+                type="text",
+                text=f"Returned cells {start} to {next_position - 1} of "
+                f"{cell_count}. More cells remain, continue with "
+                f"cursor={next_cell_id}",
+            )
+        )
+
+    return [_version_content(nb_manager.version), *notices, *results]
+
+
+def _changed_positions(
+    nb_manager: NotebookManager | LazyNotebook,
+    changed: set[str],
+    start: int,
+    stop: int,
+) -> list[int]:
+    """Positions of the changed cells still in the notebook within a range"""
+    positions = []
+    for cell_id in changed:
+        try:
+            position = nb_manager.get_cell_position(cell_id)
+        except ValueError:
+            continue
+        if start <= position < stop:
+            positions.append(position)
+    return sorted(positions)
+
+
+def _changes_content(
+    since: str, changed_count: int, changes: NotebookChanges
+) -> types.TextContent:
+    removed = ", ".join(sorted(changes.removed)) or "none"
+    return types.TextContent(
+        type="text",
+        text=f"Changes since version {since}: {changed_count} cells added or "
+        f"changed, returned below with their positions. Removed cells: {removed}",
+    )
 
 
 def _read_cell_output(
@@ -301,47 +1067,375 @@ def _read_cell_output(
     Returns:
         List of cell outputs
     """
-    nb_manager = NotebookManager(notebook_path)
-    cell = nb_manager.get_cell_by_id(cell_id)
-    results = []
+    with notebook_locks.read(notebook_path):
+        cell = None
+        if not notebook_cache.is_cached(notebook_path):
+            # Scan the file only as far as the cell, decoding no other outputs
+            notebook_writer.flush(notebook_path)
+            try:
+                with notebook_scan_seconds.time(), LazyNotebook(notebook_path) as lazy:
+                    cell = lazy.get_cell_by_id(cell_id)
+            except UnsupportedNotebook:
+                pass
+        if cell is None:
+            cell = NotebookManager(notebook_path).get_cell_by_id(cell_id)
 
-    for nb in nb_manager.parse_notebook_nodes(cell):
-        if nb.cell_type == "code":
-            results.extend(
-                [
-                    types.TextContent(
-                        type="text", text=f"Output of cell {nb.cell_id}:"
-                    ),
-                    *(output.output for output in nb.outputs),
-                ]
+        nb = NotebookCell.from_dict(cell)
+        if nb.cell_type != "code":
+            return []
+        return [
+            types.TextContent(type="text", text=f"Output of cell {nb.cell_id}:"),
+            *(output.output for output in nb.outputs),
+        ]
+
+
+def _deadline(arguments: dict) -> Optional[float]:
+    """time.monotonic() value by which a call with a timeout argument must end"""
+    timeout = arguments.get("timeout")
+    return None if timeout is None else time.monotonic() + timeout
+
+
+def _output_notifier(tool_name: str) -> Optional[Callable[[Dict[str, Any]], None]]:
+    """Build a callback that forwards cell outputs to the client of the current
+    request as log notifications, plus progress notifications if it asked for them.
+
+    Must be called on the event loop; the callback may be invoked from any thread.
+    """
+    try:
+        ctx = server.request_context
+    except LookupError:
+        return None
+
+    loop = asyncio.get_running_loop()
+    progress_token = ctx.meta.progressToken if ctx.meta else None
+    received = itertools.count(1)
+
+    def notify(msg: Dict[str, Any]) -> None:
+        output = CellOutput.from_message(msg).output
+        asyncio.run_coroutine_threadsafe(
+            ctx.session.send_log_message(
+                "info", output.model_dump(mode="json"), logger=tool_name
+            ),
+            loop,
+        )
+        if progress_token is not None:
+            asyncio.run_coroutine_threadsafe(
+                ctx.session.send_progress_notification(progress_token, next(received)),
+                loop,
             )
 
-    return results
+    return notify
 
 
 def _execute_cell(
     notebook_path: str,
     cell_id: str,
+    on_output: Optional[Callable[[Dict[str, Any]], None]] = None,
+    use_cache: bool = False,
+    deadline: Optional[float] = None,
 ) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
     """Executes a specific cell in a notebook and returns its output.
 
     Args:
         notebook_path: Path to the notebook
         cell_id: ID of the target cell
+        on_output: Optional callback receiving each output message while the
+            cell runs
+        use_cache: Reuse the outputs of an identical earlier execution
+        deadline: Optional time.monotonic() value by which the cell must have run
+
+    Returns:
+        Cell outputs, preceded by a notice if they came from the cache or if
+        the cell was interrupted
+    """
+    nb_manager = _copy_for_execution(notebook_path)
+    session = kernel_sessions.get(notebook_path)
+    cached = False
+    try:
+        if use_cache:
+            executed_nb_json, cached = nb_manager.execute_cell_cached(
+                cell_id, session, on_output, deadline
+            )
+        else:
+            executed_nb_json = nb_manager.execute_cell_by_id(
+                cell_id, {}, session=session, on_output=on_output, deadline=deadline
+            )
+    except ExecutionInterrupted as e:
+        # Like a failing cell, an interrupted one leaves the notebook unchanged
+        return [
+            *_kernel_notices(session),
+            types.TextContent(type="text", text=str(e)),
+            *(output.output for nb in e.executed for output in nb.outputs),
+        ]
+    except Exception as e:
+        notices = _kernel_notices(session)
+        if notices:
+            raise RuntimeError(
+                "\n".join([*(notice.text for notice in notices), str(e)])
+            ) from e
+        raise
+    _save_executions(notebook_path, nb_manager)
+
+    results: list[types.TextContent | types.ImageContent | types.EmbeddedResource]
+    results = [output.output for nb in executed_nb_json for output in nb.outputs]
+    if cached:
+        results.insert(
+            0,
+            types.TextContent(
+                type="text",
+                text="Cached outputs of an identical earlier execution, "
+                "the cell was not run again.",
+            ),
+        )
+    return [*_kernel_notices(session), *results]
+
+
+def _copy_for_execution(notebook_path: str) -> NotebookManager:
+    """Copy a notebook to run its cells on, so reads and changes of the
+    notebook go on meanwhile, see _save_executions"""
+    # The kernel may read the notebook file, make sure it is up to date
+    notebook_writer.flush(notebook_path)
+    with notebook_locks.read(notebook_path):
+        return NotebookManager(notebook_path).copy_for_execution()
+
+
+def _save_executions(notebook_path: str, executed: NotebookManager) -> None:
+    """Save the outputs of the cells run on a copy of a notebook into the
+    notebook, as it is now"""
+    with notebook_locks.write(notebook_path):
+        nb_manager = NotebookManager(notebook_path)
+        nb_manager.apply_executions(executed)
+        nb_manager.save_notebook()
+
+
+def _kernel_notices(session: KernelSession) -> list[types.TextContent]:
+    """Enforce the memory limit of a kernel after an execution, and explain
+    any stop or restart of it the client did not ask for"""
+    kernel_sessions.enforce_memory_limit(session)
+    return [
+        types.TextContent(type="text", text=notice)
+        for notice in session.drain_notices()
+    ]
+
+
+def _run_notebook(
+    notebook_path: str,
+    force: bool = False,
+    on_output: Optional[Callable[[Dict[str, Any]], None]] = None,
+    deadline: Optional[float] = None,
+) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
+    """Run the stale code cells of a notebook on its kernel session.
+
+    Args:
+        notebook_path: Path to the notebook
+        force: Run every code cell, even if up to date
+        on_output: Optional callback receiving each output message
+        deadline: Optional time.monotonic() value by which every cell must
+            have run
+
+    Returns:
+        A summary of the run followed by the outputs of the executed cells
+    """
+    from nbclient.exceptions import CellExecutionError
+
+    nb_manager = _copy_for_execution(notebook_path)
+    session = kernel_sessions.get(notebook_path)
+    try:
+        executed, skipped = nb_manager.run_stale_cells(
+            session, force, on_output, deadline
+        )
+        summary = (
+            f"Executed {len(executed)} cells, skipped {len(skipped)} up-to-date cells."
+        )
+    except ExecutionInterrupted as e:
+        # Keep the outputs of the cells that ran, as for a failing cell
+        executed = e.executed
+        summary = f"{e}\nStopped after {len(executed)} cells, later cells were not run."
+    except CellExecutionError as e:
+        # Keep the outputs and bookkeeping of the cells that did run
+        _save_executions(notebook_path, nb_manager)
+        return [
+            *_kernel_notices(session),
+            types.TextContent(
+                type="text",
+                text=f"Stopped at a failing cell, later cells were not run:\n{e}",
+            ),
+        ]
+    except Exception as e:
+        notices = _kernel_notices(session)
+        if notices:
+            raise RuntimeError(
+                "\n".join([*(notice.text for notice in notices), str(e)])
+            ) from e
+        raise
+    _save_executions(notebook_path, nb_manager)
+
+    results: list[types.TextContent | types.ImageContent | types.EmbeddedResource]
+    results = [*_kernel_notices(session), types.TextContent(type="text", text=summary)]
+    for nb in executed:
+        results.extend(
+            [
+                types.TextContent(type="text", text=f"Output of cell {nb.cell_id}:"),
+                *(output.output for output in nb.outputs),
+            ]
+        )
+    return results
+
+
+def _run_notebook_job(
+    notebook_path: str,
+    parameters: Optional[Dict[str, Any]],
+    output_path: str,
+    deadline: Optional[float] = None,
+) -> str:
+    """Execute a copy of a notebook on a fresh kernel and save it elsewhere.
+
+    Args:
+        notebook_path: Path to the notebook to execute
+        parameters: Optional parameters for the cells tagged 'parameters'
+        output_path: Path to save the executed notebook to
+        deadline: Optional time.monotonic() value by which every cell must
+            have run
+
+    Returns:
+        A one line status of the job
+    """
+    cancellation = current_cancellation()
+    if cancellation.cancelled:
+        return "cancelled before it started"
+
+    started = time.monotonic()
+    try:
+        nb_manager = NotebookManager(notebook_path, cached=False)
+    except Exception as e:
+        return f"failed to read the notebook: {str(e)}"
+
+    try:
+        nb_manager.execute_notebook(parameters, kernel_sessions.cell_timeout, deadline)
+        status = "succeeded"
+    except Exception as e:
+        # Execution errors end with the "ename: evalue" line of the traceback,
+        # timeouts start with what timed out
+        lines = str(e).strip().splitlines()
+        line = lines[0 if isinstance(e, TimeoutError) else -1] if lines else ""
+        status = f"failed: {line or type(e).__name__}"
+        if cancellation.cancelled:
+            status = "cancelled, the kernel was interrupted"
+
+    # Save failed runs too, their outputs show where they stopped
+    try:
+        with notebook_locks.write(output_path):
+            nb_manager.save_notebook(output_path)
+            # In write-behind mode the file must still be on disk when the job
+            # reports it saved
+            notebook_writer.flush(output_path)
+    except Exception as e:
+        return f"{status}, but saving {output_path} failed: {str(e)}"
+
+    return f"{status} in {time.monotonic() - started:.1f}s, saved to {output_path}"
+
+
+def _inspect_variables(
+    notebook_path: str,
+    names: Optional[list[str]] = None,
+    max_repr: int = DEFAULT_REPR_CHARS,
+) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
+    """Summarize variables of the kernel session of a notebook.
+
+    Args:
+        notebook_path: Path to the notebook
+        names: Optional names of the variables, all of them by default
+        max_repr: Characters of the representation of each variable
+
+    Returns:
+        The summaries, or why the variables could not be inspected
+    """
+    session = kernel_sessions.find(notebook_path)
+    if session is None or not session.is_alive:
+        return [
+            types.TextContent(
+                type="text",
+                text="No kernel is running for this notebook, execute a cell first.",
+            )
+        ]
+    if session.busy:
+        # The evaluation would queue behind the running cell on the session
+        # thread, holding an I/O worker for as long as the cell may run
+        return [
+            types.TextContent(
+                type="text",
+                text="The kernel is busy running a cell, inspect the variables "
+                "once it is done.",
+            )
+        ]
+
+    try:
+        text = inspect_variables(session, names, max_repr)
+    except (RuntimeError, ValueError) as e:
+        text = f"Could not inspect the variables: {e}"
+    return [types.TextContent(type="text", text=text)]
+
+
+def _restart_kernel(
+    notebook_path: str,
+) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
+    """Restart the kernel session of a notebook.
+
+    Args:
+        notebook_path: Path to the notebook
+
+    Returns:
+        Confirmation message
+    """
+    session = kernel_sessions.find(notebook_path)
+    if session is None or not session.is_alive:
+        return [
+            types.TextContent(
+                type="text", text="No kernel is running for this notebook."
+            )
+        ]
+
+    session.restart()
+    return [types.TextContent(type="text", text="Kernel restarted successfully.")]
+
+
+def _shutdown_kernel(
+    notebook_path: str,
+) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
+    """Shut down the kernel session of a notebook.
+
+    Args:
+        notebook_path: Path to the notebook
 
     Returns:
-        Cell outputs
+        Confirmation message
     """
-    nb_manager = NotebookManager(notebook_path)
-    executed_nb_json = nb_manager.execute_cell_by_id(cell_id, {})
-    nb_manager.save_notebook()
+    if not kernel_sessions.shutdown(notebook_path):
+        return [
+            types.TextContent(
+                type="text", text="No kernel is running for this notebook."
+            )
+        ]
 
-    return [output.output for nb in executed_nb_json for output in nb.outputs]
+    return [types.TextContent(type="text", text="Kernel shut down successfully.")]
 
 
 async def run(transport_type="stdio", port=8000):
+    try:
+        await _run_transport(transport_type, port)
+    finally:
+        notebook_writer.flush_all()
+        kernel_sessions.shutdown_all()
+        dispatcher.shutdown()
+        trace_log.close()
+
+
+async def _run_transport(transport_type: str, port: int):
     if transport_type == "stdio":
-        async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
+        async with (
+            mcp.server.stdio.stdio_server() as (read_stream, write_stream),
+            cancellable_requests(read_stream) as read_stream,
+        ):
             await server.run(
                 read_stream,
                 write_stream,
@@ -357,6 +1451,8 @@ async def run(transport_type="stdio", port=8000):
     elif transport_type == "sse":
         import uvicorn
 
+        from mcp_server_jupyter.sse_app import starlette_app
+
         config = uvicorn.Config(starlette_app, host="127.0.0.1", port=port)
         uvicorn_server = uvicorn.Server(config)
         await uvicorn_server.serve()
@@ -380,6 +1476,179 @@ def main():
         default=8000,
         help="Port for SSE transport (default: 8000)",
     )
+    parser.add_argument(
+        "--io-workers",
+        type=int,
+        default=8,
+        help="Threads serving notebook reads and writes (default: 8)",
+    )
+    parser.add_argument(
+        "--max-executions",
+        type=int,
+        default=4,
+        help="Maximum number of cells executing concurrently (default: 4)",
+    )
+
+    parser.add_argument(
+        "--write-behind-ms",
+        type=int,
+        default=0,
+        help="Coalesce saves of a notebook made within this many milliseconds "
+        "into a single write (default: 0, write every save immediately)",
+    )
+
+    parser.add_argument(
+        "--image-max-size",
+        type=int,
+        default=1024,
+        help="Downscale image outputs to at most this many pixels per side "
+        "(default: 1024, 0 to disable)",
+    )
+    parser.add_argument(
+        "--image-max-bytes",
+        type=int,
+        default=256 * 1024,
+        help="Re-encode image outputs larger than this many bytes "
+        "(default: 262144, 0 to disable)",
+    )
+    parser.add_argument(
+        "--image-format",
+        choices=list(IMAGE_FORMATS),
+        default="webp",
+        help="Format reduced image outputs are re-encoded to (default: webp)",
+    )
+
+    parser.add_argument(
+        "--output-store-threshold",
+        type=int,
+        default=0,
+        help="Return outputs larger than this many bytes as resources instead of "
+        "inline (default: 0, always inline)",
+    )
+    parser.add_argument(
+        "--output-store-dir",
+        default=None,
+        help="Directory of the output store "
+        "(default: ~/.cache/mcp-server-jupyter/outputs)",
+    )
+    parser.add_argument(
+        "--output-max-chars",
+        type=int,
+        default=20000,
+        help="Cut rich and plain text outputs to this many characters (0 for no limit)",
+    )
+    parser.add_argument(
+        "--table-max-rows",
+        type=int,
+        default=20,
+        help="Rows of an HTML table output returned as text (0 for all)",
+    )
+    parser.add_argument(
+        "--table-max-columns",
+        type=int,
+        default=20,
+        help="Columns of an HTML table output returned as text (0 for all)",
+    )
+    parser.add_argument(
+        "--stream-max-repeats",
+        type=int,
+        default=5,
+        help="Lines kept at each end of a run of similar stream output lines, "
+        "the rest are elided (0 keeps every line)",
+    )
+    parser.add_argument(
+        "--persist-compact-streams",
+        action="store_true",
+        help="Save executed cells with their stream outputs compacted",
+    )
+
+    parser.add_argument(
+        "--execution-cache-mb",
+        type=int,
+        default=64,
+        help="Memory for outputs reused by execute_cell with use_cache "
+        "(default: 64, 0 to disable)",
+    )
+    parser.add_argument(
+        "--execution-cache-ttl",
+        type=float,
+        default=3600,
+        help="Seconds cached execution outputs stay valid (default: 3600)",
+    )
+
+    parser.add_argument(
+        "--max-notebook-jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Maximum number of notebooks run_notebooks executes in parallel "
+        "(default: number of CPUs)",
+    )
+
+    parser.add_argument(
+        "--max-kernels",
+        type=int,
+        default=0,
+        help="Maximum number of notebook kernels running at once, the least "
+        "recently used idle one is shut down to start another (default: 0, "
+        "unlimited)",
+    )
+    parser.add_argument(
+        "--kernel-idle-timeout",
+        type=float,
+        default=0,
+        help="Shut down kernels unused for this many seconds (default: 0, never)",
+    )
+    parser.add_argument(
+        "--kernel-max-rss-mb",
+        type=int,
+        default=0,
+        help="Restart kernels whose resident memory exceeds this many MB "
+        "(default: 0, unlimited)",
+    )
+    parser.add_argument(
+        "--spare-kernel",
+        action="store_true",
+        help="Keep a kernel started ahead of time for the next notebook",
+    )
+
+    parser.add_argument(
+        "--cell-timeout",
+        type=int,
+        default=DEFAULT_CELL_TIMEOUT,
+        help="Seconds a cell may run before its kernel is interrupted, unless "
+        f"the cell's 'timeout' metadata says otherwise (default: "
+        f"{DEFAULT_CELL_TIMEOUT}, 0 for no limit)",
+    )
+
+    parser.add_argument(
+        "--trace-log",
+        help="Append a JSON line per tool call, with its timings, to this file "
+        "(- for stderr)",
+    )
 
     args = parser.parse_args()
+    dispatcher.configure(args.io_workers, args.max_executions, args.max_notebook_jobs)
+    notebook_writer.delay = args.write_behind_ms / 1000
+    image_reducer.max_dimension = args.image_max_size
+    image_reducer.max_bytes = args.image_max_bytes
+    image_reducer.image_format = args.image_format
+    output_store.threshold = args.output_store_threshold
+    execution_cache.max_bytes = args.execution_cache_mb * 1024 * 1024
+    execution_cache.ttl = args.execution_cache_ttl
+    if args.output_store_dir:
+        output_store.directory = args.output_store_dir
+    mime_renderers.max_chars = args.output_max_chars
+    mime_renderers.max_rows = args.table_max_rows
+    mime_renderers.max_columns = args.table_max_columns
+    stream_compactor.max_repeats = args.stream_max_repeats
+    stream_compactor.persist = args.persist_compact_streams
+    if args.trace_log:
+        trace_log.open(args.trace_log)
+    kernel_sessions.configure(
+        args.max_kernels,
+        args.kernel_idle_timeout,
+        args.kernel_max_rss_mb * 1024 * 1024,
+        args.spare_kernel,
+        args.cell_timeout,
+    )
     asyncio.run(run(args.transport, args.port))
@@ -0,0 +1,62 @@
+from mcp.server.lowlevel import NotificationOptions
+from mcp.server.models import InitializationOptions
+from mcp.server.sse import SseServerTransport
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import PlainTextResponse
+from starlette.routing import Mount, Route
+
+from mcp_server_jupyter.cancellation import cancellable_requests
+from mcp_server_jupyter.metrics import metrics
+from mcp_server_jupyter.server import server
+
+sse = SseServerTransport("/messages/")
+
+
+# Set up Starlette routes for SSE transport
+async def handle_sse(request):
+    async with sse.connect_sse(
+        request.scope, request.receive, request._send
+    ) as streams:  # noqa: SLF001
+        async with cancellable_requests(streams[0]) as read_stream:
+            await server.run(
+                read_stream,
+                streams[1],
+                InitializationOptions(
+                    server_name="Jupyter notebook manager",
+                    server_version="0.1.0",
+                    capabilities=server.get_capabilities(
+                        notification_options=NotificationOptions(),
+                        experimental_capabilities={},
+                    ),
+                ),
+            )
+
+
+async def handle_metrics(request):
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+# Configure CORS middleware
+middleware = [
+    Middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_methods=["GET", "POST"],
+        allow_headers=["Accept", "Content-Type", "Origin"],
+        expose_headers=["Content-Type", "Content-Length"],
+        allow_credentials=False,
+    )
+]
+
+starlette_app = Starlette(
+    routes=[
+        Route("/sse", endpoint=handle_sse),
+        Route("/metrics", endpoint=handle_metrics),
+        Mount("/messages/", app=sse.handle_post_message),
+    ],
+    middleware=middleware,
+)
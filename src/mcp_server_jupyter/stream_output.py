@@ -0,0 +1,112 @@
+import itertools
+import re
+from typing import Any, Mapping, Optional, Sequence
+
+import nbformat
+from nbformat import NotebookNode
+
+# Digits are ignored when comparing lines, so progress and log lines that only
+# differ by their numbers count as repeats
+_DIGITS = re.compile(r"\d+")
+# Any character but a newline followed by a backspace, which deletes it
+_BACKSPACE = re.compile(r"[^\n\b]\x08")
+
+
+def _join(text: Any) -> str:
+    return "".join(text) if isinstance(text, list) else text
+
+
+def _stream_name(output: Mapping[str, Any]) -> Optional[str]:
+    if output.get("output_type") != "stream":
+        return None
+    return output.get("name", "")
+
+
+class StreamCompactor:
+    """Compacts stream outputs the way a terminal would display them.
+
+    Consecutive outputs of the same stream are merged, carriage returns and
+    backspaces overwrite what they go back over, so a progress bar leaves only
+    its last state, and long runs of similar lines keep only their first and
+    last max_repeats lines. A max_repeats of 0 keeps every line.
+    """
+
+    def __init__(self, max_repeats: int = 5, persist: bool = False) -> None:
+        self.max_repeats: int = max_repeats
+        # Whether executed cells are saved with their compacted outputs
+        self.persist: bool = persist
+
+    def merge(self, outputs: Sequence[Mapping[str, Any]]) -> list[Mapping[str, Any]]:
+        """Merge consecutive outputs of the same stream, keeping others as is"""
+        merged: list[Mapping[str, Any]] = []
+        for name, group in itertools.groupby(outputs, key=_stream_name):
+            run = list(group)
+            if name is None or len(run) == 1:
+                merged.extend(run)
+                continue
+            # Joined once, progress bars can flush thousands of fragments
+            text = "".join(_join(output.get("text", "")) for output in run)
+            merged.append({"output_type": "stream", "name": name, "text": text})
+        return merged
+
+    def compact_text(self, text: Any) -> str:
+        """Apply carriage returns and backspaces to the text of a stream and
+        elide long runs of similar lines"""
+        text = _join(text)
+        if "\r" in text or "\b" in text:
+            text = self._apply_control_characters(text)
+        if self.max_repeats > 0 and text.count("\n") > 2 * self.max_repeats:
+            text = self._elide_repeats(text)
+        return text
+
+    def compact_outputs(self, outputs: list[NotebookNode]) -> list[NotebookNode]:
+        """Outputs of a cell as saved when persist is on: merged and compacted
+        stream outputs, other outputs as is"""
+        compacted = []
+        for output in self.merge(outputs):
+            if output.get("output_type") == "stream":
+                text = self.compact_text(output.get("text", ""))
+                if not isinstance(output, NotebookNode) or text != output.get("text"):
+                    output = nbformat.v4.new_output(
+                        "stream", name=output.get("name"), text=text
+                    )
+            compacted.append(output)
+        return compacted
+
+    @staticmethod
+    def _apply_control_characters(text: str) -> str:
+        lines = text.split("\n")
+        for number, line in enumerate(lines):
+            if "\b" in line:
+                previous = None
+                while previous != line:
+                    previous, line = line, _BACKSPACE.sub("", line)
+                line = line.replace("\b", "")
+            # A carriage return at the end of a line only moves the cursor, the
+            # last one before that starts the text that remains on screen
+            line = line.rstrip("\r")
+            lines[number] = line[line.rfind("\r") + 1 :]
+        return "\n".join(lines)
+
+    def _elide_repeats(self, text: str) -> str:
+        lines = text.split("\n")
+        keys = [_DIGITS.sub("#", line) for line in lines]
+        compacted: list[str] = []
+        run_start = 0
+        for number in range(1, len(lines) + 1):
+            if number < len(lines) and keys[number] == keys[run_start]:
+                continue
+
+            run = lines[run_start:number]
+            if len(run) > 2 * self.max_repeats + 1:
+                elided = len(run) - 2 * self.max_repeats
+                compacted.extend(run[: self.max_repeats])
+                compacted.append(f"[... {elided} similar lines elided]")
+                compacted.extend(run[-self.max_repeats :])
+            else:
+                compacted.extend(run)
+            run_start = number
+        return "\n".join(compacted)
+
+
+stream_compactor = StreamCompactor()
@@ -0,0 +1,28 @@
+from typing import Any, Callable, Optional
+
+from nbclient import NotebookClient
+from nbformat import NotebookNode
+
+# Output messages forwarded to an execution's output callback
+STREAMED_MESSAGE_TYPES = {
+    "stream",
+    "display_data",
+    "update_display_data",
+    "execute_result",
+    "error",
+}
+
+
+class StreamingNotebookClient(NotebookClient):
+    """NotebookClient that reports each output message as it arrives"""
+
+    on_output: Optional[Callable[[dict[str, Any]], None]] = None
+
+    def process_message(
+        self, msg: dict[str, Any], cell: NotebookNode, cell_index: int
+    ) -> Optional[NotebookNode]:
+        try:
+            return super().process_message(msg, cell, cell_index)
+        finally:
+            if self.on_output is not None and msg["msg_type"] in STREAMED_MESSAGE_TYPES:
+                self.on_output(msg)
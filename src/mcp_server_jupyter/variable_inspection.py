@@ -0,0 +1,177 @@
+import ast
+import json
+from typing import Any, Optional
+
+from mcp_server_jupyter.kernel_session import KernelSession
+
+# Variables summarized when none are named
+MAX_VARIABLES = 50
+# Characters of the representation of a variable returned by default
+DEFAULT_REPR_CHARS = 200
+# Columns whose dtypes are listed for a data frame
+MAX_DTYPES = 20
+
+# Runs in the kernel, in a namespace of its own, so it defines nothing in the
+# user's namespace. Every attribute it reads is guarded, as variables can be of
+# any type.
+_INSPECT_SOURCE = """
+def inspect(user_ns, names, max_variables, max_repr, max_dtypes):
+    import json
+    import reprlib
+    import sys
+    import types
+
+    skipped = (types.ModuleType, types.FunctionType, types.BuiltinFunctionType, type)
+    hidden = {"In", "Out", "exit", "quit", "get_ipython"}
+    if names is None:
+        names = [
+            name
+            for name, value in list(user_ns.items())
+            if not name.startswith("_")
+            and name not in hidden
+            and not isinstance(value, skipped)
+        ]
+
+    shortener = reprlib.Repr()
+    shortener.maxstring = shortener.maxother = max_repr
+
+    def memory(value):
+        if hasattr(value, "dtypes") or hasattr(value, "dtype"):
+            usage = getattr(value, "memory_usage", None)
+            if callable(usage):
+                total = usage()
+                return int(total.sum() if hasattr(total, "sum") else total)
+        nbytes = getattr(value, "nbytes", None)
+        if isinstance(nbytes, int):
+            return nbytes
+        return sys.getsizeof(value)
+
+    def shape(value):
+        shape = value.shape
+        if not isinstance(shape, tuple):
+            raise TypeError
+        return [int(length) for length in shape]
+
+    def dtypes(value):
+        items = list(value.dtypes.items())
+        return [[str(key), str(dtype)] for key, dtype in items[:max_dtypes]]
+
+    summaries = []
+    for name in names[:max_variables]:
+        if name not in user_ns:
+            summaries.append({"name": name, "missing": True})
+            continue
+        value = user_ns[name]
+        kind = type(value)
+        summary = {
+            "name": name,
+            "type": kind.__qualname__
+            if kind.__module__ == "builtins"
+            else f"{kind.__module__}.{kind.__qualname__}",
+        }
+        getters = (
+            ("size", memory),
+            ("shape", shape),
+            ("dtypes", dtypes),
+            ("dtype", lambda value: str(value.dtype)),
+            ("length", len),
+            ("repr", lambda value: shortener.repr(value)[:max_repr]),
+        )
+        for key, getter in getters:
+            if key == "length" and "shape" in summary:
+                continue
+            if key == "dtype" and "dtypes" in summary:
+                continue
+            try:
+                summary[key] = getter(value)
+            except Exception:
+                pass
+        summaries.append(summary)
+
+    return json.dumps(
+        {"variables": summaries, "more": max(len(names) - max_variables, 0)}
+    )
+"""
+
+
+def inspect_variables(
+    session: KernelSession,
+    names: Optional[list[str]] = None,
+    max_repr: int = DEFAULT_REPR_CHARS,
+) -> str:
+    """Summarize variables of the running kernel of a Python notebook
+
+    Nothing is printed, stored or left behind in the kernel: the summaries are
+    computed by a user expression, see KernelSession.evaluate.
+
+    Args:
+        session: Kernel session of the notebook
+        names: Names of the variables, or None for every variable other than
+             modules, functions, classes and names starting with an underscore
+        max_repr: Characters of the representation of each variable
+
+    Returns:
+        A summary per variable, with its type, approximate size in memory,
+        shape and dtypes for arrays and data frames, or length, and a
+        truncated representation
+
+    Raises:
+        RuntimeError: If no kernel is running
+        ValueError: If the kernel could not summarize the variables, e.g. as
+             it does not run Python
+    """
+    expression = (
+        "(lambda scope: (__import__('builtins').exec({source!r}, scope), "
+        "scope['inspect'](__import__('builtins').globals(), {names!r}, "
+        "{max_variables!r}, {max_repr!r}, {max_dtypes!r}))[1])({{}})"
+    ).format(
+        source=_INSPECT_SOURCE,
+        names=None if names is None else [str(name) for name in names],
+        max_variables=MAX_VARIABLES,
+        max_repr=max(int(max_repr), 0),
+        max_dtypes=MAX_DTYPES,
+    )
+    # The value is the repr of the JSON text
+    result = json.loads(ast.literal_eval(session.evaluate(expression)))
+
+    lines = [_format_variable(summary) for summary in result["variables"]]
+    if not lines:
+        lines.append("No variables are defined.")
+    if result["more"]:
+        lines.append(f"{result['more']} more variables, name them to inspect them.")
+    return "\n".join(lines)
+
+
+def _format_variable(summary: dict[str, Any]) -> str:
+    if summary.get("missing"):
+        return f"{summary['name']}: not defined"
+
+    details = [summary["type"]]
+    if "shape" in summary:
+        details.append(f"shape ({', '.join(map(str, summary['shape']))})")
+    elif "length" in summary:
+        details.append(f"length {summary['length']}")
+    if "dtypes" in summary:
+        details.append(
+            "dtypes " + ", ".join(f"{key}: {dtype}" for key, dtype in summary["dtypes"])
+        )
+    elif "dtype" in summary:
+        details.append(f"dtype {summary['dtype']}")
+    if "size" in summary:
+        details.append(_format_size(summary["size"]))
+
+    text = f"{summary['name']}: {'; '.join(details)}"
+    if "repr" in summary:
+        text += "\n" + "\n".join(f"  {line}" for line in summary["repr"].splitlines())
+    return text
+
+
+def _format_size(size: int) -> str:
+    if size < 1024:
+        return f"{size} bytes"
+    scaled = size / 1024
+    for unit in ("KB", "MB"):
+        if scaled < 1024:
+            return f"{scaled:.1f} {unit}"
+        scaled /= 1024
+    return f"{scaled:.1f} GB"